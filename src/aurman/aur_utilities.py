@@ -1,9 +1,17 @@
+import gzip
+import atexit
 import json
 import logging
-from typing import Sequence, List, Dict
-from urllib.error import URLError
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence, List, Dict, Tuple, Callable, Set
 from urllib.parse import quote_plus
-from urllib.request import urlopen
+
+import requests
+from requests.adapters import HTTPAdapter
 
 from aurman.own_exceptions import InvalidInput, ConnectionProblem
 from aurman.parsing_config import AurmanConfig
@@ -13,6 +21,574 @@ from aurman.wrappers import split_query_helper
 class AurVars:
     aur_domain: str = "https://aur.archlinux.org"
     aur_timeout: int = 5
+    # max number of AUR RPC requests to run at the same time
+    aur_threads: int = 4
+
+
+class AurSession:
+    """
+    Holds the http session shared by all AUR requests of this process.
+    Keeps the connections to the AUR alive, so that not every request
+    has to do a new TCP and TLS handshake.
+    """
+
+    session: 'requests.Session' = None
+    session_lock = threading.Lock()
+
+    @staticmethod
+    def get() -> 'requests.Session':
+        """
+        Returns the shared session, creates it on first use.
+        The connection pool is sized by AurVars.aur_threads, so it has to be created
+        after the config has been applied, which is the case on first use.
+
+        :return:    The shared session
+        """
+        with AurSession.session_lock:
+            if AurSession.session is None:
+                session = requests.Session()
+                # requests decodes gzip compressed answers on its own
+                session.headers.update({"Accept-Encoding": "gzip"})
+                pool_size = max(1, AurVars.aur_threads)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                AurSession.session = session
+
+            return AurSession.session
+
+
+def read_cache_file(cache_file: str) -> Dict:
+    """
+    Reads a json cache file written by write_cache_file.
+
+    :param cache_file:  The path of the cache file
+    :return:            The content of the cache file, None if the file
+                        is missing, unreadable or written for another aur domain
+    """
+    if not os.path.isfile(cache_file):
+        return None
+
+    try:
+        with open(cache_file, 'r') as f:
+            cache_content = json.loads(f.read())
+        # things fetched from another aur domain are not usable
+        if cache_content['aur_domain'] == AurVars.aur_domain:
+            return cache_content['content']
+    except (OSError, ValueError, TypeError, KeyError):
+        logging.debug("Loading cache file {} failed".format(cache_file), exc_info=True)
+
+    return None
+
+
+def write_cache_file(cache_file: str, content: Dict):
+    """
+    Writes a json cache file.
+    Writes to a temporary file of this process first, so that neither an aborted write
+    nor another aurman process writing at the same time can corrupt the cache file.
+
+    :param cache_file:  The path of the cache file
+    :param content:     The content to write
+    """
+    try:
+        os.makedirs(os.path.dirname(cache_file), mode=0o700, exist_ok=True)
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            f.write(json.dumps({'aur_domain': AurVars.aur_domain, 'content': content}))
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        logging.debug("Saving cache file {} failed".format(cache_file), exc_info=True)
+
+
+class AurInfoCache:
+    """
+    Persistent cache for the results of AUR info requests.
+    Keys are the names of the packages, values are tuples containing
+    the time of fetching and the info of the package as returned by the AUR.
+    """
+
+    # folder to save the cache file in, None disables the cache
+    cache_dir: str = None
+    # seconds after which cached infos have to be fetched again, 0 or less disables the cache
+    ttl: int = 300
+    # if True, cached infos will not be used, but the cache will still be filled
+    refresh: bool = False
+
+    cache: Dict[str, Tuple[float, Dict]] = None
+    cache_lock = threading.Lock()
+    # True if the cache contains infos not saved yet, it is saved once when exiting
+    dirty: bool = False
+
+    @staticmethod
+    def cache_file() -> str:
+        return os.path.join(AurInfoCache.cache_dir, "aur_info_cache")
+
+    @staticmethod
+    def enabled() -> bool:
+        return AurInfoCache.cache_dir is not None and AurInfoCache.ttl > 0
+
+    @staticmethod
+    def load():
+        """
+        Loads the cache from the cache file, if not already loaded.
+        An unusable cache file is treated like an empty cache.
+        """
+        if AurInfoCache.cache is not None:
+            return
+
+        cache_content = read_cache_file(AurInfoCache.cache_file())
+        if cache_content is None:
+            AurInfoCache.cache = {}
+        else:
+            AurInfoCache.cache = {name: tuple(entry) for name, entry in cache_content.items()}
+
+    @staticmethod
+    def lookup(package_names: Sequence[str]) -> Tuple[List[Dict], List[str]]:
+        """
+        Looks up the infos of packages in the cache.
+
+        :param package_names:   The names of the packages
+        :return:                Tuple containing the fresh cached infos
+                                and the names of the packages which have to be fetched
+        """
+        if not AurInfoCache.enabled():
+            return [], list(package_names)
+
+        with AurInfoCache.cache_lock:
+            AurInfoCache.load()
+            if AurInfoCache.refresh:
+                return [], list(package_names)
+
+            now = time.time()
+            found_infos = []
+            names_to_fetch = []
+            for package_name in package_names:
+                entry = AurInfoCache.cache.get(package_name)
+                if entry is not None and 0 <= now - entry[0] < AurInfoCache.ttl:
+                    found_infos.append(entry[1])
+                else:
+                    names_to_fetch.append(package_name)
+
+            return found_infos, names_to_fetch
+
+    @staticmethod
+    def store(infos: Sequence[Dict]):
+        """
+        Stores fetched infos in the cache.
+        The cache is saved once when exiting, not on every call.
+
+        :param infos:   The infos as returned by the AUR
+        """
+        if not AurInfoCache.enabled():
+            return
+
+        with AurInfoCache.cache_lock:
+            AurInfoCache.load()
+            now = time.time()
+            for info in infos:
+                AurInfoCache.cache[info['Name']] = (now, info)
+            if not AurInfoCache.dirty:
+                AurInfoCache.dirty = True
+                atexit.register(AurInfoCache.save)
+
+    @staticmethod
+    def save():
+        """
+        Saves the cache, if it contains infos not saved yet.
+        Expired entries are dropped while saving.
+        """
+        with AurInfoCache.cache_lock:
+            if not AurInfoCache.dirty or not AurInfoCache.enabled():
+                return
+
+            now = time.time()
+            AurInfoCache.cache = {
+                name: entry for name, entry in AurInfoCache.cache.items() if 0 <= now - entry[0] < AurInfoCache.ttl
+            }
+            write_cache_file(AurInfoCache.cache_file(), AurInfoCache.cache)
+            AurInfoCache.dirty = False
+
+
+class AurNegativeCache:
+    """
+    Persistent cache for names of installed packages, which are not in the AUR.
+    Keys are the names of the packages, values are tuples containing
+    the time of the AUR request and the install date of the package at that time.
+    """
+
+    # folder to save the cache file in, None disables the cache
+    cache_dir: str = None
+    # seconds after which the AUR has to be asked again
+    ttl: int = 86400
+    # if True, cached names will not be used, but the cache will still be filled
+    refresh: bool = False
+
+    cache: Dict[str, Tuple[float, str]] = None
+
+    @staticmethod
+    def cache_file() -> str:
+        return os.path.join(AurNegativeCache.cache_dir, "not_in_aur_cache")
+
+    @staticmethod
+    def load():
+        """
+        Loads the cache from the cache file, if not already loaded.
+        """
+        if AurNegativeCache.cache is not None:
+            return
+
+        cache_content = read_cache_file(AurNegativeCache.cache_file())
+        if cache_content is None:
+            AurNegativeCache.cache = {}
+        else:
+            AurNegativeCache.cache = {name: tuple(entry) for name, entry in cache_content.items()}
+
+    @staticmethod
+    def lookup(install_dates: Dict[str, str]) -> Set[str]:
+        """
+        Looks up which of the installed packages are known to not be in the AUR.
+        Entries are only valid if they are not expired and the install date did not change.
+
+        :param install_dates:   Names of the installed packages as keys, their install dates as values
+        :return:                The names known to not be in the AUR
+        """
+        if AurNegativeCache.cache_dir is None or AurNegativeCache.refresh:
+            return set()
+
+        AurNegativeCache.load()
+        now = time.time()
+        known_names = set()
+        for name, install_date in install_dates.items():
+            entry = AurNegativeCache.cache.get(name)
+            if entry is not None and 0 <= now - entry[0] < AurNegativeCache.ttl and entry[1] == install_date:
+                known_names.add(name)
+
+        return known_names
+
+    @staticmethod
+    def store(asked_install_dates: Dict[str, str], found_names: Set[str]):
+        """
+        Stores the result of asking the AUR for installed packages and saves the cache, if it changed.
+        Expired entries are dropped while saving.
+
+        :param asked_install_dates: Names of the packages asked for as keys, their install dates as values
+        :param found_names:         The names found in the AUR
+        """
+        if AurNegativeCache.cache_dir is None or not asked_install_dates:
+            return
+
+        AurNegativeCache.load()
+        now = time.time()
+        changed = False
+        for name, install_date in asked_install_dates.items():
+            if name in found_names:
+                if AurNegativeCache.cache.pop(name, None) is not None:
+                    changed = True
+            else:
+                AurNegativeCache.cache[name] = (now, install_date)
+                changed = True
+
+        fresh_cache = {
+            name: entry for name, entry in AurNegativeCache.cache.items()
+            if 0 <= now - entry[0] < AurNegativeCache.ttl
+        }
+        if len(fresh_cache) != len(AurNegativeCache.cache):
+            AurNegativeCache.cache = fresh_cache
+            changed = True
+
+        if changed:
+            write_cache_file(AurNegativeCache.cache_file(), AurNegativeCache.cache)
+
+
+class AurDepGraph:
+    """
+    Dependency graph of AUR packages recorded on earlier runs.
+    Keys are the names of the packages, values are tuples containing the time of recording
+    and the names of their relevant deps (without versioning).
+    Used to predict which packages will be needed next while resolving AUR dependencies.
+    """
+
+    # folder to save the graph in, None disables the graph
+    cache_dir: str = None
+    # seconds after which packages not recorded again are dropped from the graph
+    ttl: int = 2592000
+
+    graph: Dict[str, Tuple[float, List[str]]] = None
+    # True if the graph contains deps not saved yet, it is saved once when exiting
+    dirty: bool = False
+
+    @staticmethod
+    def graph_file() -> str:
+        return os.path.join(AurDepGraph.cache_dir, "aur_dep_graph")
+
+    @staticmethod
+    def load():
+        """
+        Loads the graph from the graph file, if not already loaded.
+        """
+        if AurDepGraph.graph is not None:
+            return
+
+        graph_content = read_cache_file(AurDepGraph.graph_file())
+        if graph_content is None:
+            AurDepGraph.graph = {}
+        else:
+            # entries recorded without time by older versions are dropped
+            AurDepGraph.graph = {
+                name: tuple(entry) for name, entry in graph_content.items()
+                if len(entry) == 2 and isinstance(entry[0], (int, float))
+            }
+
+    @staticmethod
+    def predict(packages_names: Sequence[str], is_known: Callable[[str], bool]) -> List[str]:
+        """
+        Predicts the names of packages which will be needed because of the given packages,
+        by following the recorded deps transitively.
+
+        :param packages_names:  The names of the packages which are going to be fetched
+        :param is_known:        Returns True for names which do not have to be fetched,
+                                the deps of those are not followed
+        :return:                The predicted names, not containing packages_names
+        """
+        if AurDepGraph.cache_dir is None:
+            return []
+
+        AurDepGraph.load()
+        now = time.time()
+        predicted_names = []
+        visited_names = set(packages_names)
+        names_to_visit = list(packages_names)
+        while names_to_visit:
+            entry = AurDepGraph.graph.get(names_to_visit.pop())
+            if entry is None or not 0 <= now - entry[0] < AurDepGraph.ttl:
+                continue
+            for dep_name in entry[1]:
+                if dep_name in visited_names or is_known(dep_name):
+                    continue
+                visited_names.add(dep_name)
+                predicted_names.append(dep_name)
+                names_to_visit.append(dep_name)
+
+        return predicted_names
+
+    @staticmethod
+    def record(deps_of_packages: Dict[str, List[str]]):
+        """
+        Records the deps of packages in the graph.
+        The graph is saved once when exiting, not on every call.
+
+        :param deps_of_packages:    Keys are the names of the packages, values the names of their deps
+        """
+        if AurDepGraph.cache_dir is None or not deps_of_packages:
+            return
+
+        AurDepGraph.load()
+        now = time.time()
+        for name, deps in deps_of_packages.items():
+            AurDepGraph.graph[name] = (now, deps)
+        if not AurDepGraph.dirty:
+            AurDepGraph.dirty = True
+            atexit.register(AurDepGraph.save)
+
+    @staticmethod
+    def save():
+        """
+        Saves the graph, if it contains deps not saved yet.
+        Expired entries, e.g. of packages no longer installed or deleted from the AUR, are dropped while saving.
+        """
+        if not AurDepGraph.dirty or AurDepGraph.cache_dir is None:
+            return
+
+        now = time.time()
+        AurDepGraph.graph = {
+            name: entry for name, entry in AurDepGraph.graph.items() if 0 <= now - entry[0] < AurDepGraph.ttl
+        }
+        write_cache_file(AurDepGraph.graph_file(), AurDepGraph.graph)
+        AurDepGraph.dirty = False
+
+
+class AurIndex:
+    """
+    Local index of the AUR built from the bulk metadata archive of the AUR.
+    The archive is downloaded only if it changed (ETag) and is saved as sqlite database,
+    which is memory mapped while querying.
+    Answers the same queries as the AUR RPC, so no RPC requests are needed, if the index is used.
+    """
+
+    # folder to save the index in, None disables the index
+    cache_dir: str = None
+    # max number of package names per sqlite query
+    max_names_per_query: int = 500
+    # bytes of the index to memory map
+    mmap_size: int = 1 << 30
+
+    connection: 'sqlite3.Connection' = None
+    connection_lock = threading.Lock()
+
+    @staticmethod
+    def index_file() -> str:
+        return os.path.join(AurIndex.cache_dir, "aur_index.sqlite")
+
+    @staticmethod
+    def read_etag() -> str:
+        """
+        Returns the ETag of the archive the current index has been built from.
+
+        :return:    The ETag or None, if there is no usable index
+        """
+        if not os.path.isfile(AurIndex.index_file()):
+            return None
+
+        try:
+            connection = sqlite3.connect(AurIndex.index_file())
+            try:
+                meta = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            logging.debug("Reading AUR index {} failed".format(AurIndex.index_file()), exc_info=True)
+            return None
+
+        # an index built from another aur domain is not usable
+        if meta.get('aur_domain') != AurVars.aur_domain:
+            return None
+
+        return meta.get('etag', '')
+
+    @staticmethod
+    def build(packages_infos: Sequence[Dict], etag: str):
+        """
+        Builds the index from the infos of the bulk metadata archive.
+        Builds into a temporary file first, so that an aborted build cannot corrupt the index.
+
+        :param packages_infos:  The package infos of the archive
+        :param etag:            The ETag of the archive
+        """
+        tmp_file = "{}.tmp".format(AurIndex.index_file())
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+
+        connection = sqlite3.connect(tmp_file)
+        try:
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute(
+                "CREATE TABLE packages (name TEXT PRIMARY KEY, description TEXT, record TEXT) WITHOUT ROWID"
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO packages VALUES (?, ?, ?)",
+                ((info['Name'], info.get('Description'), json.dumps(info)) for info in packages_infos)
+            )
+            connection.executemany(
+                "INSERT INTO meta VALUES (?, ?)", (('etag', etag), ('aur_domain', AurVars.aur_domain))
+            )
+            connection.commit()
+        finally:
+            connection.close()
+
+        os.replace(tmp_file, AurIndex.index_file())
+
+    @staticmethod
+    def update():
+        """
+        Downloads the bulk metadata archive of the AUR, if it changed since the last download,
+        and rebuilds the index.
+        If the download fails, an already existing index is used.
+        """
+        try:
+            os.makedirs(AurIndex.cache_dir, mode=0o700, exist_ok=True)
+        except OSError:
+            logging.error("Creating cache dir {} failed".format(AurIndex.cache_dir))
+            raise InvalidInput("Creating cache dir {} failed".format(AurIndex.cache_dir))
+
+        etag = AurIndex.read_etag()
+        url = AurVars.aur_domain + "/packages-meta-ext-v1.json.gz"
+        headers = {"If-None-Match": etag} if etag else {}
+
+        try:
+            response = AurSession.get().get(url, headers=headers, timeout=AurVars.aur_timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            if etag is not None:
+                logging.debug("Fetching {} failed, using the existing AUR index".format(url), exc_info=True)
+                return
+            logging.error("Connection problem while fetching {}".format(url), exc_info=True)
+            raise ConnectionProblem("Connection problem while fetching {}".format(url))
+
+        if response.status_code == 304:
+            logging.debug("AUR index is up to date")
+            return
+
+        try:
+            content = response.content
+            # decompress, if the archive has not been transfer decoded by requests already
+            if content[:2] == b'\x1f\x8b':
+                content = gzip.decompress(content)
+            packages_infos = json.loads(content)
+        except (OSError, ValueError):
+            logging.error("Decoding problem while fetching {}".format(url), exc_info=True)
+            raise InvalidInput("Decoding problem while fetching {}".format(url))
+
+        logging.debug("Building AUR index of {} packages".format(len(packages_infos)))
+        AurIndex.build(packages_infos, response.headers.get("ETag", ""))
+
+    @staticmethod
+    def get_connection() -> 'sqlite3.Connection':
+        """
+        Returns the connection to the index, updates the index on first use.
+
+        :return:    The connection
+        """
+        if AurIndex.connection is None:
+            AurIndex.update()
+            AurIndex.connection = sqlite3.connect(AurIndex.index_file(), check_same_thread=False)
+            AurIndex.connection.execute("PRAGMA query_only = ON")
+            AurIndex.connection.execute("PRAGMA mmap_size = {}".format(AurIndex.mmap_size))
+
+        return AurIndex.connection
+
+    @staticmethod
+    def get_aur_info(package_names: Sequence[str], search: bool = False, by_name: bool = False) -> List[Dict]:
+        """
+        Answers get_aur_info from the index.
+
+        :param package_names:   The names of the packages in a sequence
+        :param search:          True if one wants to search instead of getting info
+        :param by_name:         If one wants to search by name only
+        :return:                A list containing the infos as the RPC would return them
+        """
+        with AurIndex.connection_lock:
+            try:
+                connection = AurIndex.get_connection()
+                if search:
+                    records = []
+                    for keyword in package_names:
+                        # case insensitive substring search, as the RPC does
+                        pattern = "%{}%".format(
+                            keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                        )
+                        if by_name:
+                            records.extend(connection.execute(
+                                "SELECT record FROM packages WHERE name LIKE ? ESCAPE '\\'", (pattern,)
+                            ).fetchall())
+                        else:
+                            records.extend(connection.execute(
+                                "SELECT record FROM packages WHERE name LIKE ? ESCAPE '\\' "
+                                "OR description LIKE ? ESCAPE '\\'", (pattern, pattern)
+                            ).fetchall())
+                else:
+                    records = []
+                    package_names = list(package_names)
+                    for i in range(0, len(package_names), AurIndex.max_names_per_query):
+                        names_chunk = package_names[i:i + AurIndex.max_names_per_query]
+                        records.extend(connection.execute(
+                            "SELECT record FROM packages WHERE name IN ({})".format(",".join("?" * len(names_chunk))),
+                            names_chunk
+                        ).fetchall())
+            except sqlite3.Error:
+                logging.error("Querying the AUR index {} failed".format(AurIndex.index_file()), exc_info=True)
+                raise InvalidInput("Querying the AUR index {} failed".format(AurIndex.index_file()))
+
+        return [json.loads(record[0]) for record in records]
 
 
 def get_aur_info(package_names: Sequence[str], search: bool = False, by_name: bool = False) -> List[Dict]:
@@ -26,6 +602,19 @@ def get_aur_info(package_names: Sequence[str], search: bool = False, by_name: bo
     :return:                A list containing the "results" values of the RPC answer.
     """
 
+    # answer from the local index of the aur, if enabled
+    if AurIndex.cache_dir is not None:
+        return AurIndex.get_aur_info(package_names, search, by_name)
+
+    # serve fresh infos from the cache, fetch the rest
+    cached_infos = []
+    if not search:
+        cached_infos, package_names = AurInfoCache.lookup(package_names)
+        if cached_infos:
+            logging.debug("AUR infos of {} packages served from cache".format(len(cached_infos)))
+        if not package_names:
+            return cached_infos
+
     max_query_length = 8000
     if not search:
         query_url = AurVars.aur_domain + "/rpc/?v=5&type=info"
@@ -43,23 +632,44 @@ def get_aur_info(package_names: Sequence[str], search: bool = False, by_name: bo
 
     queries_parameters = split_query_helper(max_query_length, query_url_length, query_prefix_length, package_names)
 
-    results_list = []
-    for query_parameters in queries_parameters:
+    def fetch_query(query_parameters: Sequence[str]) -> List[Dict]:
+        """
+        Fetches the results for a single chunk of the query
+
+        :param query_parameters:    The parameters of this chunk
+        :return:                    The "results" value of the RPC answer
+        """
         try:
             url = "{}{}".format(
                 query_url,
                 ''.join(["{}{}".format(query_prefix, parameter) for parameter in query_parameters])
             )
-            with urlopen(url, timeout=AurVars.aur_timeout) as response:
-                results_list.extend(json.loads(response.read())['results'])
-        except URLError:
+            response = AurSession.get().get(url, timeout=AurVars.aur_timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
             logging.error("Connection problem while requesting AUR info for {}".format(package_names), exc_info=True)
             raise ConnectionProblem("Connection problem while requesting AUR info for {}".format(package_names))
-        except json.JSONDecodeError:
+
+        try:
+            return response.json()['results']
+        except ValueError:
             logging.error("Decoding problem while requesting AUR info for {}".format(package_names), exc_info=True)
             raise InvalidInput("Decoding problem while requesting AUR info for {}".format(package_names))
 
-    return results_list
+    # no need for a pool in case of a single chunk
+    if len(queries_parameters) == 1:
+        results_list = fetch_query(queries_parameters[0])
+    else:
+        # fetch the chunks concurrently, the results are merged in the order of the chunks
+        results_list = []
+        with ThreadPoolExecutor(max_workers=max(1, min(AurVars.aur_threads, len(queries_parameters)))) as executor:
+            for results in executor.map(fetch_query, queries_parameters):
+                results_list.extend(results)
+
+    if not search:
+        AurInfoCache.store(results_list)
+
+    return cached_infos + results_list
 
 
 def is_devel(name: str) -> bool:
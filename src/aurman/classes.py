@@ -1,18 +1,27 @@
 import fnmatch
+import hashlib
 import logging
 import os
+import pickle
 import re
+import sys
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, auto
 from subprocess import run, PIPE, DEVNULL
 from typing import Sequence, List, Tuple, Set, Union, Dict, Iterable
 
 from pycman.config import PacmanConfig
 
-from aurman.aur_utilities import is_devel, get_aur_info, AurVars
+from aurman.aur_utilities import is_devel, get_aur_info, AurVars, AurDepGraph, AurNegativeCache
 from aurman.coloring import aurman_status, aurman_note, aurman_error, aurman_question, Colors
 from aurman.own_exceptions import InvalidInput, ConnectionProblem
 from aurman.parsing_config import packages_from_other_sources
-from aurman.utilities import strip_versioning_from_name, split_name_with_versioning, version_comparison, ask_user
+from aurman.persistent import PersistentList, PersistentMap
+from aurman.utilities import strip_versioning_from_name, version_comparison, ask_user, dep_atom, DepAtom, \
+    version_key, version_comparison_by_keys
 from aurman.wrappers import expac, makepkg, pacman
 
 
@@ -26,39 +35,308 @@ class PossibleTypes(Enum):
     PACKAGE_NOT_REPO_NOT_AUR = auto()
 
 
+class DepAlgoGraph:
+    """
+    Class used to give the packages and deps seen while solving the dependency problem dense integer ids,
+    so that sets of them are ints used as bitsets.
+    Built lazily for one run of the dep solving, the installed and the upstream system must not change meanwhile.
+    """
+
+    # max number of memoized dep plans, 0 disables memoizing
+    dep_plans_size: int = 4096
+
+    def __init__(self, installed_system: 'System', upstream_system: 'System'):
+        self.installed_system: 'System' = installed_system
+        self.upstream_system: 'System' = upstream_system
+
+        self.packages: List['Package'] = []  # the packages, package ids as indices
+        self.package_ids: Dict[int, int] = {}  # id() of the packages as keys, package ids as values
+        self.package_deps: List[Union[array, None]] = []  # dep ids of the relevant deps of the packages
+        self.package_depends: List[int] = []  # bitsets of the dep ids of the depends of the packages
+        # ids of the packages by name and version, for testing membership in lists of packages
+        self.universe: 'PackageUniverse' = PackageUniverse()
+        self.package_equal_bits: List[int] = []  # bits of the packages in the universe
+
+        self.deps: List[str] = []  # the deps, dep ids as indices
+        self.dep_ids: Dict[str, int] = {}  # the deps as keys, dep ids as values
+        self.dep_stripped_names: List[str] = []  # the deps without versioning
+        self.dep_installed: bytearray = bytearray()  # 1 if the dep is provided by the installed system, 0 otherwise
+        self.dep_providers: List[Union[array, None]] = []  # package ids of the providers in the upstream system
+        self.dep_provider_bits: List[int] = []  # bitsets of the ids of all packages providing the deps
+        self.package_conflict_bits: List[int] = []  # bitsets of the ids of all packages conflicting with the packages
+        # number of package ids the bitsets above have been computed for, extended when new packages get ids
+        self.dep_provider_bits_checked: List[int] = []
+        self.package_conflict_bits_checked: List[int] = []
+
+        # memoized results of dep_plan, least recently used first
+        self.dep_plans: OrderedDict = OrderedDict()
+        self.dep_plans_hits: int = 0
+        self.dep_plans_misses: int = 0
+
+    def package_id(self, package: 'Package') -> int:
+        """
+        :param package:     The package
+        :return:            The id of the package
+        """
+        package_id = self.package_ids.get(id(package))
+        if package_id is None:
+            package_id = self.package_ids[id(package)] = len(self.packages)
+            self.packages.append(package)
+            self.package_deps.append(None)
+            self.package_depends.append(0)
+            self.package_equal_bits.append(1 << self.universe.package_id(package))
+            self.package_conflict_bits.append(0)
+            self.package_conflict_bits_checked.append(0)
+        return package_id
+
+    def dep_id(self, dep: str) -> int:
+        """
+        :param dep:     The dep
+        :return:        The id of the dep
+        """
+        dep_id = self.dep_ids.get(dep)
+        if dep_id is None:
+            dep_id = self.dep_ids[dep] = len(self.deps)
+            self.deps.append(dep)
+            self.dep_stripped_names.append(strip_versioning_from_name(dep))
+            self.dep_installed.append(1 if self.installed_system.provided_by(dep) else 0)
+            self.dep_providers.append(None)
+            self.dep_provider_bits.append(0)
+            self.dep_provider_bits_checked.append(0)
+        return dep_id
+
+    def deps_of(self, package_id: int) -> array:
+        """
+        :param package_id:  The id of the package
+        :return:            The ids of the relevant deps of the package, in the order of Package.relevant_deps
+        """
+        package_deps = self.package_deps[package_id]
+        if package_deps is None:
+            package = self.packages[package_id]
+            package_deps = self.package_deps[package_id] = array(
+                'i', [self.dep_id(dep) for dep in package.relevant_deps()]
+            )
+            for dep in package.relevant_deps(only_depends=True):
+                self.package_depends[package_id] |= 1 << self.dep_id(dep)
+        return package_deps
+
+    def dep_plan(self, package_id: int, is_build_available: bool,
+                 deps_to_deep_check: Set[str]) -> Tuple[Tuple[int, ...], Tuple[Tuple[int, Tuple['Package', ...]], ...]]:
+        """
+        Determines which deps of a package have to be solved and by which dep providers.
+        Does not depend on the solutions, but shared deps are reached in every branch of the dep solving,
+        hence the results are memoized.
+
+        :param package_id:          The id of the package
+        :param is_build_available:  If a built package is available, so only normal dependencies are relevant
+        :param deps_to_deep_check:  Set containing deps to check all possible dep providers of.
+                                    Only grows while dep solving, so its length identifies it.
+        :return:                    Tuple containing two items:
+                                        First item:
+                                            The ids of the deps not provided by any package
+                                        Second item:
+                                            Tuples containing the id of a dep to solve and its relevant dep providers
+        """
+        key = (package_id, is_build_available, len(deps_to_deep_check))
+        dep_plan = self.dep_plans.get(key)
+        if dep_plan is not None:
+            self.dep_plans_hits += 1
+            self.dep_plans.move_to_end(key)
+            return dep_plan
+        self.dep_plans_misses += 1
+
+        not_provided_deps = []
+        deps_to_solve = []
+        package_deps = self.deps_of(package_id)
+        package_depends = self.package_depends[package_id]
+        for dep in package_deps:
+
+            # skip since already provided
+            if self.dep_installed[dep]:
+                continue
+
+            # skip since built package available and dep is not a normal dependency
+            # so it's make and/or check dep
+            if is_build_available and not package_depends >> dep & 1:
+                continue
+
+            # fetch dep providers
+            dep_providers = self.providers_of(dep)
+            if not dep_providers:
+                not_provided_deps.append(dep)
+                continue
+
+            # we only need relevant dep providers
+            # deps_to_deep_check will be filled
+            # when we encounter problems as dep-cycle, conflicts ...
+            dep_stripped_name = self.dep_stripped_names[dep]
+            if dep_stripped_name in [package.name for package in dep_providers] \
+                    and self.deps[dep] not in deps_to_deep_check:
+                dep_providers = [package for package in dep_providers if package.name == dep_stripped_name]
+
+            deps_to_solve.append((dep, tuple(dep_providers)))
+
+        dep_plan = (tuple(not_provided_deps), tuple(deps_to_solve))
+        if DepAlgoGraph.dep_plans_size > 0:
+            self.dep_plans[key] = dep_plan
+            if len(self.dep_plans) > DepAlgoGraph.dep_plans_size:
+                self.dep_plans.popitem(last=False)
+        return dep_plan
+
+    def log_info(self):
+        """
+        Logs the hits and misses of the memoized dep plans
+        """
+        dep_plans_queries = self.dep_plans_hits + self.dep_plans_misses
+        if dep_plans_queries:
+            logging.debug(
+                "Dep plans of dep solving: {} of {} queries hit ({:.1%}), {} memoized".format(
+                    self.dep_plans_hits, dep_plans_queries, self.dep_plans_hits / dep_plans_queries,
+                    len(self.dep_plans)
+                )
+            )
+
+    def providers_of(self, dep_id: int) -> List['Package']:
+        """
+        :param dep_id:  The id of the dep
+        :return:        The providers of the dep in the upstream system
+        """
+        return [self.packages[package_id] for package_id in self.provider_ids_of(dep_id)]
+
+    def provider_ids_of(self, dep_id: int) -> array:
+        """
+        :param dep_id:  The id of the dep
+        :return:        The package ids of the providers of the dep in the upstream system
+        """
+        dep_providers = self.dep_providers[dep_id]
+        if dep_providers is None:
+            dep_providers = self.dep_providers[dep_id] = array(
+                'i', [self.package_id(package) for package in self.upstream_system.provided_by(self.deps[dep_id])]
+            )
+        return dep_providers
+
+    def is_upstream_package(self, package: 'Package') -> bool:
+        """
+        :param package:     The package
+        :return:            True if the package is contained in the upstream system, False otherwise
+        """
+        return self.upstream_system.all_packages_dict.get(package.name) is package
+
+    def provider_bits_of(self, dep_id: int) -> int:
+        """
+        Providing a dep only depends on the providing package itself,
+        so the dep is provided by a set of packages, if the set intersects with the returned bitset.
+
+        :param dep_id:  The id of the dep
+        :return:        Bitset of the ids of the packages providing the dep
+        """
+        # may give new packages ids, hence before checking for new packages
+        upstream_provider_ids = self.provider_ids_of(dep_id)
+        checked = self.dep_provider_bits_checked[dep_id]
+        if checked == len(self.packages):
+            return self.dep_provider_bits[dep_id]
+
+        upstream_provider_ids = set(upstream_provider_ids)
+        dep = self.deps[dep_id]
+        bits = self.dep_provider_bits[dep_id]
+        for package_id in range(checked, len(self.packages)):
+            if package_id in upstream_provider_ids:
+                bits |= 1 << package_id
+                continue
+            package = self.packages[package_id]
+            if not self.is_upstream_package(package) and System((package,)).provided_by(dep):
+                bits |= 1 << package_id
+
+        self.dep_provider_bits[dep_id] = bits
+        self.dep_provider_bits_checked[dep_id] = len(self.packages)
+        return bits
+
+    def conflict_bits_of(self, package_id: int) -> int:
+        """
+        Conflicting only depends on the two packages,
+        so the packages of a set conflicting with the package are the intersection of the set with the returned bitset.
+
+        :param package_id:  The id of the package
+        :return:            Bitset of the ids of the packages conflicting with the package
+        """
+        checked = self.package_conflict_bits_checked[package_id]
+        if checked == len(self.packages):
+            return self.package_conflict_bits[package_id]
+
+        package = self.packages[package_id]
+        upstream_conflicting = set(id(conflicting) for conflicting in self.upstream_system.conflicting_with(package))
+        bits = self.package_conflict_bits[package_id]
+        for other_id in range(checked, len(self.packages)):
+            other_package = self.packages[other_id]
+            if self.is_upstream_package(other_package):
+                if id(other_package) in upstream_conflicting:
+                    bits |= 1 << other_id
+            elif System((other_package,)).conflicting_with(package):
+                bits |= 1 << other_id
+
+        self.package_conflict_bits[package_id] = bits
+        self.package_conflict_bits_checked[package_id] = len(self.packages)
+        return bits
+
+    def packages_of(self, bitset: int) -> List['Package']:
+        """
+        :param bitset:  Bitset of package ids
+        :return:        The packages
+        """
+        return [self.packages[package_id] for package_id in DepAlgoGraph.ids_of(bitset)]
+
+    @staticmethod
+    def ids_of(bitset: int) -> Iterable[int]:
+        """
+        :param bitset:  The bitset
+        :return:        The ids contained in the bitset, ascending
+        """
+        while bitset:
+            lowest_bit = bitset & -bitset
+            yield lowest_bit.bit_length() - 1
+            bitset ^= lowest_bit
+
+
 class DepAlgoSolution:
     """
-    Class used to track solutions while solving the dependency problem
+    Class used to track solutions while solving the dependency problem.
+    The state is kept in immutable structures, which are replaced instead of changed,
+    so solutions share it and copying a solution is free.
     """
 
-    def __init__(self, packages_in_solution, visited_packages, visited_names):
-        self.packages_in_solution: List['Package'] = packages_in_solution  # containing the packages of the solution
-        self.visited_packages: List['Package'] = visited_packages  # needed for tracking dep cycles
-        self.visited_names: Set[str] = visited_names  # needed for tracking provided deps
-        self.not_to_delete_deps: Set[str] = set()  # tracking deps which must not be deleted
+    def __init__(self, packages_in_solution, visited_packages, visited_deps):
+        self.packages_in_solution: PersistentList = packages_in_solution  # containing the packages of the solution
+        self.visited_packages: PersistentList = visited_packages  # needed for tracking dep cycles
+        self.visited_deps: int = visited_deps  # bitset of dep ids, needed for tracking provided deps
+        self.not_to_delete_deps: int = 0  # bitset of dep ids, tracking deps which must not be deleted
         self.is_valid: bool = True  # may be set to False by the algorithm in case of conflicts, dep-cycles, ...
-        self.dict_to_way: Dict[str, List['Package']] = {}  # needed for tracking the way the packages have been called
-        self.dict_to_deps: Dict[str, Set[str]] = {}  # needed for tracking which deps are being provided by the packages
-        self.dict_call_as_needed: Dict[str, bool] = {}  # needed for tracking if package may be removed
-        self.installed_solution_packages: Set['Package'] = set()  # needed for tracking which packages are installed
+        # PersistentLists of packages, needed for tracking the way the packages have been called
+        self.dict_to_way: PersistentMap = PersistentMap()
+        # bitsets of dep ids, tracking which deps the packages provide
+        self.dict_to_deps: PersistentMap = PersistentMap()
+        # needed for tracking if package may be removed, not changed while solving, hence shared by the copies
+        self.dict_call_as_needed: Dict[str, bool] = {}
+        self.installed_solution_packages: int = 0  # bitset of package ids, tracking which packages are installed
+        # bitsets of the ids in DepAlgoGraph.universe of the packages in packages_in_solution and visited_packages
+        self.packages_in_solution_bits: int = 0
+        self.visited_packages_bits: int = 0
 
     def solution_copy(self):
         """
-        Copies a solution as deep as we need it while dep solving
+        Copies a solution, which only copies the references to the immutable state
         Performance + !
 
         :return:    A copy of the solution
         """
-        to_return = DepAlgoSolution(self.packages_in_solution[:], self.visited_packages[:], set(self.visited_names))
+        to_return = DepAlgoSolution(self.packages_in_solution, self.visited_packages, self.visited_deps)
         to_return.is_valid = self.is_valid
-        to_return.not_to_delete_deps = set(self.not_to_delete_deps)
-        for key, value in self.dict_to_way.items():
-            to_return.dict_to_way[key] = value[:]
-        for key, value in self.dict_to_deps.items():
-            to_return.dict_to_deps[key] = set(value)
-        for key, value in self.dict_call_as_needed.items():
-            to_return.dict_call_as_needed[key] = value
-        to_return.installed_solution_packages = set(self.installed_solution_packages)
+        to_return.not_to_delete_deps = self.not_to_delete_deps
+        to_return.dict_to_way = self.dict_to_way
+        to_return.dict_to_deps = self.dict_to_deps
+        to_return.dict_call_as_needed = self.dict_call_as_needed
+        to_return.installed_solution_packages = self.installed_solution_packages
+        to_return.packages_in_solution_bits = self.packages_in_solution_bits
+        to_return.visited_packages_bits = self.visited_packages_bits
         return to_return
 
 
@@ -169,6 +447,43 @@ class Package:
     # ignore all versioned dependencies
     # default is FALSE, may be set to TRUE via a command line flag
     ignore_versioning: bool = False
+    # the fields of a package, in the order of the parameters of __init__
+    fields = (
+        'name', 'version', 'depends', 'conflicts', 'optdepends', 'provides', 'replaces', 'pkgbase', 'install_reason',
+        'makedepends', 'checkdepends', 'type_of', 'repo', 'groups', 'install_date'
+    )
+    # the fields returned by as_dict, e.g. in the output of aurmansolver
+    dict_fields = tuple(field for field in fields if field != 'install_date')
+
+    # there are tens of thousands of packages, so no __dict__ per package
+    __slots__ = (
+        'name', '_version', 'depends', 'conflicts', 'optdepends', 'provides', 'replaces', 'pkgbase', 'install_reason',
+        'makedepends', 'checkdepends', 'type_of', 'repo', 'groups', 'install_date', '_hash',
+        '_version_key'
+    )
+
+    # query the pacman databases in-process via pyalpm instead of calling expac
+    # default is FALSE, may be set to TRUE via the aurman config
+    use_pyalpm: bool = False
+    # expac formatters yielding lists
+    list_formatters = "DHoPTG"
+    # expac formatters and how to get the same values from pyalpm packages
+    alpm_getters = {
+        'n': lambda alpm_package: alpm_package.name,
+        'v': lambda alpm_package: alpm_package.version,
+        'D': lambda alpm_package: list(alpm_package.depends),
+        'H': lambda alpm_package: list(alpm_package.conflicts),
+        # expac prints the optdepends with their descriptions
+        'o': lambda alpm_package: " ".join(alpm_package.optdepends).split(),
+        'P': lambda alpm_package: list(alpm_package.provides),
+        'T': lambda alpm_package: list(alpm_package.replaces),
+        # expac prints (null) for packages without base
+        'e': lambda alpm_package: alpm_package.base if alpm_package.base else '(null)',
+        'G': lambda alpm_package: list(alpm_package.groups),
+        'r': lambda alpm_package: alpm_package.db.name,
+        'w': lambda alpm_package: "explicit" if alpm_package.reason == 0 else "dependency",
+        'l': lambda alpm_package: str(alpm_package.installdate)
+    }
 
     @staticmethod
     def get_packages_from_aur(packages_names: Sequence[str]) -> List['Package']:
@@ -302,8 +617,65 @@ class Package:
         return [db.name for db in PacmanConfig(conf="/etc/pacman.conf").initialize_alpm().get_syncdbs()]
 
     @staticmethod
-    def get_packages_from_expac(expac_operation: str, packages_names: Sequence[str], packages_type: PossibleTypes) -> \
-            List['Package']:
+    def query_databases(operation: str, formatting: Sequence[str], packages_names: Sequence[str],
+                        repos: Sequence[str] = None, raw_formatters: str = "") -> List[List]:
+        """
+        Queries the pacman databases, via expac or in-process via pyalpm if Package.use_pyalpm is set.
+        Operations and formatters as in https://github.com/falconindy/expac
+        Supported formatters are the keys of Package.alpm_getters
+
+        :param operation:       The expac operation. "-S" or "-Q".
+        :param formatting:      The formatters
+        :param packages_names:  The names of the packages to query.
+                                May also be empty, so that all packages are being returned.
+        :param repos:           Only with "-S". If given, only the packages of these repos are being returned.
+                                formatting has to contain "r" in that case.
+        :param raw_formatters:  List formatters whose values are not to be parsed yet.
+                                They yield raw values, to be parsed by LazyPackage.parse_raw_value.
+                                The unsplit str from expac, the unparsed list from pyalpm
+        :return:                One list per package containing the values of the formatters.
+                                Formatters contained in Package.list_formatters yield lists, all others str
+        """
+        if not Package.use_pyalpm:
+            records = []
+            for line in expac(operation, formatting, packages_names):
+                records.append([
+                    value.split() if formatter in Package.list_formatters and formatter not in raw_formatters
+                    else value
+                    for formatter, value in zip(formatting, line.split("?!"))
+                ])
+
+            # expac cannot be restricted to repos
+            if repos is not None:
+                repo_index = list(formatting).index('r')
+                records = [record for record in records if record[repo_index] in repos]
+
+            return records
+
+        handler = PacmanConfig(conf="/etc/pacman.conf").initialize_alpm()
+        if "Q" in operation:
+            dbs = [handler.get_localdb()]
+        else:
+            assert "S" in operation
+            dbs = handler.get_syncdbs()
+            if repos is not None:
+                dbs = [db for db in dbs if db.name in repos]
+
+        if packages_names:
+            alpm_packages = [
+                alpm_package for db in dbs for alpm_package in (db.get_pkg(name) for name in packages_names)
+                if alpm_package is not None
+            ]
+        else:
+            alpm_packages = [alpm_package for db in dbs for alpm_package in db.pkgcache]
+
+        # all values are fetched right away, the pyalpm packages must not outlive the handle
+        getters = [Package.alpm_getters[formatter] for formatter in formatting]
+        return [[getter(alpm_package) for getter in getters] for alpm_package in alpm_packages]
+
+    @staticmethod
+    def get_packages_from_expac(expac_operation: str, packages_names: Sequence[str], packages_type: PossibleTypes,
+                                repos: Sequence[str] = None) -> List['Package']:
         """
         Generates and returns packages from an expac query.
         see: https://github.com/falconindy/expac
@@ -312,33 +684,34 @@ class Package:
         :param packages_names:      The names of the packages to generate.
                                     May also be empty, so that all packages are being returned.
         :param packages_type:       The type of the packages. PossibleTypes Enum value
+        :param repos:               Only with "-S". If given, all packages of these repos are being returned,
+                                    without choosing between packages with the same name from multiple repos
         :return:                    List containing the packages
         """
         if "Q" in expac_operation:
-            formatting = list("nvDHoPTeGw")
-            repos = []
-            repo_dict = {}
+            formatting = list("nvDHoPTeGwl")
+            raw_formatters = ""
         else:
             assert "S" in expac_operation
             formatting = list("nvDHoPTeGr")
-            repos = Package.get_known_repos()
-            # packages the user wants to install from another repo
-            repo_dict = packages_from_other_sources()[1]
+            # most repo packages are never looked at closely, so some of their fields are parsed on first access
+            raw_formatters = "DoTG"
 
-        expac_return = expac(expac_operation, formatting, packages_names)
-        return_dict = {}
+        records = Package.query_databases(expac_operation, formatting, packages_names, repos, raw_formatters)
+        return_list = []
 
-        for line in expac_return:
-            splitted_line = line.split("?!")
+        for splitted_line in records:
             to_expand = {
                 'name': splitted_line[0],
                 'version': splitted_line[1],
-                'depends': splitted_line[2].split(),
-                'conflicts': splitted_line[3].split(),
-                'optdepends': splitted_line[4].split(),
-                'provides': splitted_line[5].split(),
-                'replaces': splitted_line[6].split(),
-                'groups': splitted_line[8].split()
+                'conflicts': splitted_line[3],
+                'provides': splitted_line[5]
+            }
+            lazy_fields = {
+                'depends': splitted_line[2],
+                'optdepends': splitted_line[4],
+                'replaces': splitted_line[6],
+                'groups': splitted_line[8]
             }
 
             if packages_type is PossibleTypes.AUR_PACKAGE or packages_type is PossibleTypes.DEVEL_PACKAGE:
@@ -358,28 +731,55 @@ class Package:
 
             if "Q" in expac_operation:
                 to_expand['install_reason'] = splitted_line[9]
+                to_expand['install_date'] = splitted_line[10]
             else:
-                assert "S" in expac_operation
                 to_expand['repo'] = splitted_line[9]
 
-                # continue if we explicitly want a package from a specific repo
-                # and the package is not from that repo
-                # or if the order of the repos in pacman.conf tells us to
-                if to_expand['name'] in return_dict:
-                    if to_expand['name'] in repo_dict:
-                        if to_expand['repo'] == repo_dict[to_expand['name']]:
-                            pass
-                        elif return_dict[to_expand['name']].repo != repo_dict[to_expand['name']]:
-                            if repos.index(return_dict[to_expand['name']].repo) < repos.index(to_expand['repo']):
-                                continue
-
-                    elif repos.index(return_dict[to_expand['name']].repo) < repos.index(to_expand['repo']):
-                        continue
-
             if to_expand['name'] in to_expand['conflicts']:
                 to_expand['conflicts'].remove(to_expand['name'])
 
-            return_dict[to_expand['name']] = Package(**to_expand)
+            if raw_formatters:
+                return_list.append(LazyPackage(lazy_fields, **to_expand))
+            else:
+                to_expand.update(lazy_fields)
+                return_list.append(Package(**to_expand))
+
+        if "S" in expac_operation and repos is None:
+            return Package.choose_repo_packages(return_list)
+
+        return return_list
+
+    @staticmethod
+    def choose_repo_packages(repo_packages: Sequence['Package']) -> List['Package']:
+        """
+        Chooses one package per name from packages of multiple repos.
+        Packages the user wants from a specific repo are taken from that repo,
+        all others from the first repo in the pacman.conf containing them.
+
+        :param repo_packages:   The packages of the repos
+        :return:                List containing the chosen packages
+        """
+        repos = Package.get_known_repos()
+        # packages the user wants to install from another repo
+        repo_dict = packages_from_other_sources()[1]
+        return_dict = {}
+
+        for package in repo_packages:
+            # continue if we explicitly want a package from a specific repo
+            # and the package is not from that repo
+            # or if the order of the repos in pacman.conf tells us to
+            if package.name in return_dict:
+                if package.name in repo_dict:
+                    if package.repo == repo_dict[package.name]:
+                        pass
+                    elif return_dict[package.name].repo != repo_dict[package.name]:
+                        if repos.index(return_dict[package.name].repo) < repos.index(package.repo):
+                            continue
+
+                elif repos.index(return_dict[package.name].repo) < repos.index(package.repo):
+                    continue
+
+            return_dict[package.name] = package
 
         # check if all repos the user gave us are actually known
         for repo_package_name in repo_dict:
@@ -414,28 +814,95 @@ class Package:
 
     def __init__(
             self, name, version, depends=None, conflicts=None, optdepends=None, provides=None, replaces=None,
-            pkgbase=None, install_reason=None, makedepends=None, checkdepends=None, type_of=None, repo=None, groups=None
+            pkgbase=None, install_reason=None, makedepends=None, checkdepends=None, type_of=None, repo=None,
+            groups=None, install_date=None
     ):
-        self.name: str = name  # %n
+        # strings are interned, since the same names and deps occur in many packages
+        # names with versioning are stored as already split DepAtoms
+        self.name: str = Package.intern(name)  # %n
         self.version: str = version  # %v
-        self.depends: Sequence[str] = depends  # %D
-        self.conflicts: Sequence[str] = conflicts  # %H
-        self.optdepends: Sequence[str] = optdepends  # %o
-        self.provides: Sequence[str] = provides  # %P
-        self.replaces: Sequence[str] = replaces  # %T
-        self.pkgbase: str = pkgbase  # %e
-        self.install_reason: str = install_reason  # %w (only with -Q)
-        self.makedepends: Sequence[str] = makedepends  # aur only
-        self.checkdepends: Sequence[str] = checkdepends  # aur only
+        self.depends: Sequence[DepAtom] = Package.dep_atoms(depends)  # %D
+        self.conflicts: Sequence[DepAtom] = Package.dep_atoms(conflicts)  # %H
+        self.optdepends: Sequence[str] = Package.intern_all(optdepends)  # %o
+        self.provides: Sequence[DepAtom] = Package.dep_atoms(provides)  # %P
+        self.replaces: Sequence[DepAtom] = Package.dep_atoms(replaces)  # %T
+        self.pkgbase: str = Package.intern(pkgbase)  # %e
+        self.install_reason: str = Package.intern(install_reason)  # %w (only with -Q)
+        self.makedepends: Sequence[DepAtom] = Package.dep_atoms(makedepends)  # aur only
+        self.checkdepends: Sequence[DepAtom] = Package.dep_atoms(checkdepends)  # aur only
         self.type_of: PossibleTypes = type_of  # PossibleTypes Enum value
-        self.repo: str = repo  # %r (only useful for upstream repo packages)
-        self.groups: Sequence[str] = groups  # %G
+        self.repo: str = Package.intern(repo)  # %r (only useful for upstream repo packages)
+        self.groups: Sequence[str] = Package.intern_all(groups)  # %G
+        self.install_date: str = install_date  # %l (only with -Q)
+
+    @staticmethod
+    def intern(string: str) -> str:
+        if string is None:
+            return None
+        return sys.intern(string)
+
+    @staticmethod
+    def intern_all(strings: Iterable[str]) -> Tuple[str, ...]:
+        if strings is None:
+            return None
+        return tuple([sys.intern(string) for string in strings])
+
+    @staticmethod
+    def dep_atoms(names: Iterable[str]) -> Tuple[DepAtom, ...]:
+        if names is None:
+            return None
+        return tuple([dep_atom(name) for name in names])
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    @version.setter
+    def version(self, version: str):
+        # the hash and the version key depend on the version
+        self._version = Package.intern(version)
+        self._hash = None
+        self._version_key = None
+
+    @property
+    def version_key(self) -> Tuple:
+        # computed on first use, see utilities.version_key
+        if self._version_key is None:
+            self._version_key = version_key(self._version)
+        return self._version_key
+
+    def compare_versions(self, comparison_operator: str, other: 'Package') -> bool:
+        """
+        Compares the version of this package with the version of another package.
+        e.g. "1.1-1" ">=" "1.0-1" -> True
+
+        :param comparison_operator:     Comparison operator
+        :param other:                   The other package
+        :return:                        True if the conditional relationship holds, False otherwise
+        """
+        return version_comparison_by_keys(
+            self.version, comparison_operator, other.version, self.version_key, other.version_key
+        )
+
+    def as_dict(self) -> Dict:
+        """
+        Returns the fields of this package in a dict
+
+        :return:    The names of the fields as keys, the values of the fields as values
+        """
+        return {field: getattr(self, field) for field in Package.dict_fields}
+
+    def __reduce__(self):
+        # pickle via __init__, so that unpickled packages are interned, too
+        return Package, tuple([getattr(self, field) for field in Package.fields])
 
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and self.name == other.name and self.version == other.version
+        return isinstance(other, Package) and self.name == other.name and self.version == other.version
 
     def __hash__(self):
-        return hash((self.name, self.version))
+        if self._hash is None:
+            self._hash = hash((self.name, self._version))
+        return self._hash
 
     def __repr__(self):
         return "{}-{}".format(self.name, self.version)
@@ -463,7 +930,7 @@ class Package:
 
     def solutions_for_dep_problem(self, solution: 'DepAlgoSolution', found_problems: Set['DepAlgoFoundProblems'],
                                   installed_system: 'System', upstream_system: 'System',
-                                  deps_to_deep_check: Set[str]) -> List['DepAlgoSolution']:
+                                  deps_to_deep_check: Set[str], graph: 'DepAlgoGraph') -> List['DepAlgoSolution']:
         """
         Heart of this AUR helper. Algorithm for dependency solving.
         Also checks for conflicts, dep-cycles and topologically sorts the solutions.
@@ -473,6 +940,7 @@ class Package:
         :param installed_system:        The currently installed system
         :param upstream_system:         The system containing the known upstream packages
         :param deps_to_deep_check:      Set containing deps to check all possible dep providers of
+        :param graph:                   The ids of the packages and deps of the installed and the upstream system
         :return:                        The found solutions
         """
 
@@ -501,102 +969,80 @@ class Package:
 
             return return_solutions
 
-        if self in solution.installed_solution_packages:
+        own_id = graph.package_id(self)
+        own_bit = 1 << own_id
+        own_equal_bit = graph.package_equal_bits[own_id]
+
+        if solution.installed_solution_packages & own_bit:
             return [solution.solution_copy()]
 
         # dep cycle
         # dirty... thanks to dep cycle between mesa and libglvnd
-        if self in solution.visited_packages and not (self.type_of is PossibleTypes.REPO_PACKAGE):
+        if solution.visited_packages_bits & own_equal_bit and not (self.type_of is PossibleTypes.REPO_PACKAGE):
             # problem only relevant
             # if the solution is not already invalid
             if solution.is_valid:
-                index_of_self = solution.visited_packages.index(self)
+                visited_packages = list(solution.visited_packages)
+                index_of_self = visited_packages.index(self)
                 cycle_packages = []
-                for i in range(index_of_self, len(solution.visited_packages)):
-                    cycle_packages.append(solution.visited_packages[i])
+                for i in range(index_of_self, len(visited_packages)):
+                    cycle_packages.append(visited_packages[i])
                 cycle_packages.append(self)
 
                 # create the problem
                 cycle_problem = DepAlgoCycle(cycle_packages)
                 for package in cycle_packages:
                     cycle_problem.relevant_packages.add(package)
-                    cycle_problem.relevant_packages |= set(solution.dict_to_way.get(package.name, []))
+                    cycle_problem.relevant_packages |= set(solution.dict_to_way.get(package.name, ()))
                 found_problems.add(cycle_problem)
             invalid_sol = solution.solution_copy()
             invalid_sol.is_valid = False
             return [invalid_sol]
 
         # pacman has to handle dep cycles between repo packages
-        elif self in solution.visited_packages:
+        elif solution.visited_packages_bits & own_equal_bit:
             return [solution.solution_copy()]
 
         # copy solution and add self to visited packages
         solution: 'DepAlgoSolution' = solution.solution_copy()
-        is_build_available: bool = self in solution.packages_in_solution
-        own_way: List['Package'] = solution.dict_to_way.get(self.name, [])
-        own_not_to_delete_deps: Set[str] = set()
-        solution.visited_packages.append(self)
+        is_build_available: bool = bool(solution.packages_in_solution_bits & own_equal_bit)
+        own_way: PersistentList = solution.dict_to_way.get(self.name, PersistentList())
+        own_not_to_delete_deps: int = 0
+        solution.visited_packages = solution.visited_packages.append(self)
+        solution.visited_packages_bits |= own_equal_bit
         current_solutions: List['DepAlgoSolution'] = [solution]
 
-        # filter not fulfillable deps
-        relevant_deps = self.relevant_deps()
-        for dep in relevant_deps[:]:
-
-            # skip since already provided
-            if installed_system.provided_by(dep):
-                continue
-
-            # skip since built package available and dep is not a normal dependency
-            # so it's make and/or check dep
-            if is_build_available and dep not in self.relevant_deps(only_depends=True):
-                continue
+        not_provided_deps, deps_to_solve = graph.dep_plan(own_id, is_build_available, deps_to_deep_check)
 
+        # not fulfillable deps
+        for dep in not_provided_deps:
             # dep not fulfillable, solutions not valid
-            if not upstream_system.provided_by(dep):
-                for solution in current_solutions:
-                    solution.is_valid = False
-
-                # create problem
-                dep_problem = DepAlgoNotProvided(dep, self)
-                dep_problem.relevant_packages.add(self)
-                dep_problem.relevant_packages |= set(own_way)
-                found_problems.add(dep_problem)
+            for solution in current_solutions:
+                solution.is_valid = False
 
-                relevant_deps.remove(dep)
+            # create problem
+            dep_problem = DepAlgoNotProvided(graph.deps[dep], self)
+            dep_problem.relevant_packages.add(self)
+            dep_problem.relevant_packages |= set(own_way)
+            found_problems.add(dep_problem)
 
         # AND - every dep has to be fulfilled
         # we filtered the unfulfillable deps,
         # hence at least one dep provider is available
-        for dep in relevant_deps:
-
-            # skip since already provided
-            if installed_system.provided_by(dep):
-                continue
-
-            # skip since built package available and dep is not a normal dependency
-            # so it's make and/or check dep
-            if is_build_available and dep not in self.relevant_deps(only_depends=True):
-                continue
-
-            # fetch dep providers
-            dep_providers = upstream_system.provided_by(dep)
-            dep_providers_names = [package.name for package in dep_providers]
-            dep_stripped_name = strip_versioning_from_name(dep)
-
-            # we only need relevant dep providers
-            # deps_to_deep_check will be filled
-            # when we encounter problems as dep-cycle, conflicts ...
-            if dep_stripped_name in dep_providers_names and dep not in deps_to_deep_check:
-                dep_providers = [package for package in dep_providers if package.name == dep_stripped_name]
+        for dep, dep_providers in deps_to_solve:
+            dep_bit = 1 << dep
 
             # OR - at least one of the dep providers needs to provide the dep
-            finished_solutions = [solution for solution in current_solutions if dep in solution.visited_names]
-            not_finished_solutions = [solution for solution in current_solutions if dep not in solution.visited_names]
+            finished_solutions = [solution for solution in current_solutions if solution.visited_deps & dep_bit]
+            not_finished_solutions = [
+                solution for solution in current_solutions if not solution.visited_deps & dep_bit
+            ]
 
             # check if dep provided by one of the packages already in a solution
             new_not_finished_solutions = []
+            dep_provider_bits = graph.provider_bits_of(dep) if not_finished_solutions else 0
             for solution in not_finished_solutions:
-                if System(list(solution.installed_solution_packages)).provided_by(dep):
+                if solution.installed_solution_packages & dep_provider_bits:
                     finished_solutions.append(solution)
                 else:
                     new_not_finished_solutions.append(solution)
@@ -604,9 +1050,9 @@ class Package:
 
             # track deps which may not be deleted
             for solution in current_solutions:
-                if dep not in solution.not_to_delete_deps:
-                    solution.not_to_delete_deps.add(dep)
-                    own_not_to_delete_deps.add(dep)
+                if not solution.not_to_delete_deps & dep_bit:
+                    solution.not_to_delete_deps |= dep_bit
+                    own_not_to_delete_deps |= dep_bit
 
             # calc and append new solutions
             current_solutions = finished_solutions
@@ -618,36 +1064,35 @@ class Package:
                 # add dep to visited names
                 # and create another container
                 # for problem tracking
-                solution.visited_names.add(dep)
+                solution.visited_deps |= dep_bit
                 new_problems: List[Set['DepAlgoFoundProblems']] = []
 
                 for dep_provider in dep_providers:
+                    dict_to_way_before = solution.dict_to_way
+                    dict_to_deps_before = solution.dict_to_deps
                     # way to the package being called in the current solution
                     if dep_provider.name not in solution.dict_to_way:
-                        way_added = True
-                        solution.dict_to_way[dep_provider.name] = own_way[:]
-                        solution.dict_to_way[dep_provider.name].append(self)
-                    else:
-                        way_added = False
+                        solution.dict_to_way = solution.dict_to_way.set(dep_provider.name, own_way.append(self))
                     # tracking for which deps the package being called has been chosen as provider
-                    if dep_provider.name not in solution.dict_to_deps:
-                        solution.dict_to_deps[dep_provider.name] = set()
-                    solution.dict_to_deps[dep_provider.name].add(dep)
+                    provided_deps = solution.dict_to_deps.get(dep_provider.name, 0)
+                    solution.dict_to_deps = solution.dict_to_deps.set(dep_provider.name, provided_deps | dep_bit)
 
                     # call this function recursively on the dep provider
                     # and yield an empty found_problems set instance
                     found_problems.clear()
                     current_solutions.extend(
                         dep_provider.solutions_for_dep_problem(
-                            solution, found_problems, installed_system, upstream_system, deps_to_deep_check
+                            solution, found_problems, installed_system, upstream_system, deps_to_deep_check, graph
                         )
                     )
                     # save the new problems
                     new_problems.append(set(found_problems))
                     # remove added things
-                    solution.dict_to_deps[dep_provider.name].remove(dep)
-                    if way_added:
-                        del solution.dict_to_way[dep_provider.name]
+                    solution.dict_to_way = dict_to_way_before
+                    if provided_deps & dep_bit:
+                        solution.dict_to_deps = dict_to_deps_before.set(dep_provider.name, provided_deps & ~dep_bit)
+                    else:
+                        solution.dict_to_deps = dict_to_deps_before
 
                 # reset the problems to the problems
                 # we had before calling the dep
@@ -690,6 +1135,7 @@ class Package:
             current_solutions = filter_solutions(current_solutions)
 
         # conflict checking
+        own_conflict_bits = graph.conflict_bits_of(own_id)
         for solution in current_solutions:
             # as with dep cycles,
             # conflicts are only relevant
@@ -697,20 +1143,21 @@ class Package:
             if not solution.is_valid:
                 continue
 
-            # generate hypothetic system containing the packages of the current solution
-            # and check for conflicts with that system
-            installed_packages = list(solution.installed_solution_packages)
-            conf_system = System(installed_packages).conflicting_with(self)
+            # check for conflicts with the packages of the current solution
+            conflicting_bits = solution.installed_solution_packages & own_conflict_bits
 
             # if there are no conflicts, nothing will get deleted, so we may
             # safely assume that we do not get an invalid solution
-            if not conf_system:
+            if not conflicting_bits:
                 continue
 
+            conf_system = graph.packages_of(conflicting_bits)
+            installed_packages = graph.packages_of(solution.installed_solution_packages)
+
             # append the whole current solution to the currently
             # installed system
             # may be empty in case of deep_search
-            packages_to_append = solution.packages_in_solution[:]
+            packages_to_append = list(solution.packages_in_solution)
             packages_to_append.append(self)
             new_system = installed_system.hypothetical_append_packages_to_system(packages_to_append)
 
@@ -733,13 +1180,13 @@ class Package:
             # e.g. A needs B and C, B has been solved with this algo
             # but C not, hence B must remain provided
             # otherwise A cannot be installed
-            for dep in solution.not_to_delete_deps:
+            for dep in DepAlgoGraph.ids_of(solution.not_to_delete_deps):
                 if not is_possible:
                     break
-                if not new_system.provided_by(dep):
+                if not new_system.provided_by(graph.deps[dep]):
                     additional_message = "While trying to install {}, the needed dependency {} has been removed".format(
                         Colors.BOLD(Colors.LIGHT_MAGENTA(self.name)),
-                        Colors.BOLD(Colors.LIGHT_MAGENTA(dep))
+                        Colors.BOLD(Colors.LIGHT_MAGENTA(graph.deps[dep]))
                     )
                     is_possible = False
                     break
@@ -767,13 +1214,12 @@ class Package:
                     # besides the knowledge that the package
                     # has already been built
                     if package.name not in new_system.all_packages_dict:
-                        solution.installed_solution_packages.remove(package)
+                        solution.installed_solution_packages &= ~(1 << graph.package_id(package))
                         if package.name in solution.dict_to_deps:
-                            for dep in solution.dict_to_deps[package.name]:
-                                solution.visited_names.remove(dep)
-                            del solution.dict_to_deps[package.name]
+                            solution.visited_deps &= ~solution.dict_to_deps[package.name]
+                            solution.dict_to_deps = solution.dict_to_deps.delete(package.name)
                         if package.name in solution.dict_to_way:
-                            del solution.dict_to_way[package.name]
+                            solution.dict_to_way = solution.dict_to_way.delete(package.name)
 
                 # for the case that there are no installed packages
                 if is_possible:
@@ -785,7 +1231,7 @@ class Package:
             conflicting_packages.add(self)
             ways_to_conflict = []
             for package in conflicting_packages:
-                way_to_conflict = solution.dict_to_way.get(package.name, [])[:]
+                way_to_conflict = list(solution.dict_to_way.get(package.name, ()))
                 way_to_conflict.append(package)
                 ways_to_conflict.append(way_to_conflict)
 
@@ -803,10 +1249,12 @@ class Package:
 
         # add self to packages in solution, those are always topologically sorted
         for solution in current_solutions:
-            solution.not_to_delete_deps -= own_not_to_delete_deps
-            solution.installed_solution_packages.add(self)
-            solution.packages_in_solution.append(self)
-            solution.visited_packages.remove(self)
+            solution.not_to_delete_deps &= ~own_not_to_delete_deps
+            solution.installed_solution_packages |= own_bit
+            solution.packages_in_solution = solution.packages_in_solution.append(self)
+            solution.packages_in_solution_bits |= own_equal_bit
+            solution.visited_packages = solution.visited_packages.remove(self)
+            solution.visited_packages_bits &= ~own_equal_bit
 
         # may contain invalid solutions !!!
         # but also filtered
@@ -825,62 +1273,74 @@ class Package:
                                         Every inner list contains the packages for the solution topologically sorted
         """
 
-        deps_to_deep_check = set()
-        single_first = False
+        # the systems do not change while solving, so the lookups in them may be cached
+        systems_to_cache = [system for system in (installed_system, upstream_system) if system.query_cache is None]
+        for system in systems_to_cache:
+            system.enable_query_cache()
 
-        while True:
-            current_solutions = [DepAlgoSolution([], [], set())]
-            found_problems = set()
+        try:
+            graph = DepAlgoGraph(installed_system, upstream_system)
+            deps_to_deep_check = set()
+            single_first = False
+
+            while True:
+                current_solutions = [DepAlgoSolution(PersistentList(), PersistentList(), 0)]
+                found_problems = set()
+
+                # calc solutions
+                # for every single package first
+                if single_first:
+                    for package in packages:
+                        new_solutions = []
+                        for solution in current_solutions:
+                            solution.dict_call_as_needed = {package.name: True}
+                            new_solutions.extend(
+                                package.solutions_for_dep_problem(
+                                    solution, found_problems, installed_system, upstream_system, deps_to_deep_check,
+                                    graph
+                                )
+                            )
+                        current_solutions = new_solutions
 
-            # calc solutions
-            # for every single package first
-            if single_first:
+                # now for all packages together
+                for solution in current_solutions:
+                    solution.dict_call_as_needed = {}
+                    for package in packages:
+                        solution.dict_call_as_needed[package.name] = True
                 for package in packages:
                     new_solutions = []
                     for solution in current_solutions:
-                        solution.dict_call_as_needed = {package.name: True}
                         new_solutions.extend(
                             package.solutions_for_dep_problem(
-                                solution, found_problems, installed_system, upstream_system, deps_to_deep_check
+                                solution, found_problems, installed_system, upstream_system, deps_to_deep_check, graph
                             )
                         )
                     current_solutions = new_solutions
 
-            # now for all packages together
-            for solution in current_solutions:
-                solution.dict_call_as_needed = {}
-                for package in packages:
-                    solution.dict_call_as_needed[package.name] = True
-            for package in packages:
-                new_solutions = []
-                for solution in current_solutions:
-                    new_solutions.extend(
-                        package.solutions_for_dep_problem(
-                            solution, found_problems, installed_system, upstream_system, deps_to_deep_check
-                        )
-                    )
-                current_solutions = new_solutions
-
-            # delete invalid solutions
-            current_solutions = [solution for solution in current_solutions if solution.is_valid]
-
-            # in case of at least one solution, we are done
-            if current_solutions:
-                break
-
-            deps_to_deep_check_length = len(deps_to_deep_check)
-            for problem in found_problems:
-                problem_packages_names = set([package.name for package in problem.relevant_packages])
-                deps_to_deep_check |= problem_packages_names
-
-            # if there are no new deps to deep check, we are done, too
-            if len(deps_to_deep_check) == deps_to_deep_check_length and single_first:
-                break
-            elif len(deps_to_deep_check) == deps_to_deep_check_length:
-                if len(packages) > 1:
-                    single_first = True
-                else:
+                # delete invalid solutions
+                current_solutions = [solution for solution in current_solutions if solution.is_valid]
+
+                # in case of at least one solution, we are done
+                if current_solutions:
+                    break
+
+                deps_to_deep_check_length = len(deps_to_deep_check)
+                for problem in found_problems:
+                    problem_packages_names = set([package.name for package in problem.relevant_packages])
+                    deps_to_deep_check |= problem_packages_names
+
+                # if there are no new deps to deep check, we are done, too
+                if len(deps_to_deep_check) == deps_to_deep_check_length and single_first:
                     break
+                elif len(deps_to_deep_check) == deps_to_deep_check_length:
+                    if len(packages) > 1:
+                        single_first = True
+                    else:
+                        break
+        finally:
+            for system in systems_to_cache:
+                system.disable_query_cache()
+        graph.log_info()
 
         # output for user
         if found_problems and not current_solutions:
@@ -890,7 +1350,7 @@ class Package:
                 ), True
             )
 
-        return [solution.packages_in_solution for solution in current_solutions]
+        return [list(solution.packages_in_solution) for solution in current_solutions]
 
     def fetch_pkgbuild(self):
         """
@@ -1271,6 +1731,262 @@ class Package:
         return build_dir, package_install_file
 
 
+class LazyPackage(Package):
+    """
+    Package parsing some of its fields only when they are accessed first.
+    Used for the repo packages, since most of them are never looked at beyond
+    their names, versions, provides and conflicts.
+    """
+
+    # the fields which are parsed on first access, and how to store their values
+    lazy_fields = {
+        'depends': Package.dep_atoms,
+        'optdepends': Package.intern_all,
+        'replaces': Package.dep_atoms,
+        'groups': Package.intern_all
+    }
+
+    __slots__ = ('raw_fields',)
+
+    def __init__(self, raw_fields: Dict, **kwargs):
+        """
+        :param raw_fields:  The names of the lazy fields as keys, the raw values as values,
+                            see LazyPackage.parse_raw_value
+        :param kwargs:      The other fields as for Package
+        """
+        super().__init__(**kwargs)
+        self.raw_fields: Dict = raw_fields
+
+        # the lazy fields must not be set, so that accessing them ends up in __getattr__
+        for field in LazyPackage.lazy_fields:
+            delattr(self, field)
+
+    @staticmethod
+    def parse_raw_value(raw_value) -> List[str]:
+        """
+        Parses a raw value as returned by Package.query_databases for raw formatters
+
+        :param raw_value:   Either the unsplit string from expac or the already split values
+        :return:            The parsed values
+        """
+        if isinstance(raw_value, str):
+            return raw_value.split()
+        return raw_value
+
+    @staticmethod
+    def from_pickle(raw_fields: Dict, fields: Dict) -> 'LazyPackage':
+        """
+        Rebuilds a pickled package, see LazyPackage.__reduce__
+
+        :param raw_fields:  The raw fields as for LazyPackage
+        :param fields:      The other fields as for Package
+        :return:            The package
+        """
+        return LazyPackage(raw_fields, **fields)
+
+    def __reduce__(self):
+        # pickle the not yet parsed fields raw, so that unpickling does not parse them either
+        raw_fields = dict(self.raw_fields)
+        for field in LazyPackage.lazy_fields:
+            if field not in raw_fields:
+                raw_fields[field] = getattr(self, field)
+        fields = {field: getattr(self, field) for field in Package.fields if field not in LazyPackage.lazy_fields}
+        return LazyPackage.from_pickle, (raw_fields, fields)
+
+    def __getattr__(self, item):
+        # only called if the attribute is not set, so for not yet parsed lazy fields
+        if item not in LazyPackage.lazy_fields:
+            raise AttributeError(item)
+
+        value = LazyPackage.lazy_fields[item](LazyPackage.parse_raw_value(self.raw_fields.pop(item)))
+        setattr(self, item, value)
+        return value
+
+
+class RepoSnapshots:
+    """
+    Snapshots of the parsed packages of the sync databases, one snapshot per repo.
+    A snapshot is only used, if the database file of the repo is still the same,
+    identified by the size, the modification time and the hash of the file.
+    The file is only hashed if the size and the modification time are the same.
+    """
+
+    # folder to save the snapshots in, None disables the snapshots
+    cache_dir: str = None
+    # has to be increased whenever the pickled Package objects change
+    format_version: int = 3
+
+    @staticmethod
+    def snapshot_file(repo: str) -> str:
+        # no folder for the snapshots, since -Sc treats all folders in the cache dir as clones of aur packages
+        return os.path.join(RepoSnapshots.cache_dir, "repo_snapshot_{}".format(repo))
+
+    @staticmethod
+    def file_stat(db_file: str) -> Tuple[int, int]:
+        """
+        :param db_file:     The path of the database file
+        :return:            Tuple containing the size and the modification time in ns of the file
+        """
+        file_stat = os.stat(db_file)
+        return file_stat.st_size, file_stat.st_mtime_ns
+
+    @staticmethod
+    def file_hash(db_file: str) -> str:
+        """
+        :param db_file:     The path of the database file
+        :return:            The sha256 hash of the file
+        """
+        file_hash = hashlib.sha256()
+        with open(db_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                file_hash.update(chunk)
+
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def fingerprint(db_file: str) -> Tuple[int, int, str]:
+        """
+        Calculates the fingerprint of a database file
+
+        :param db_file:     The path of the database file
+        :return:            Tuple containing the size, the modification time in ns and the sha256 hash of the file
+        """
+        return RepoSnapshots.file_stat(db_file) + (RepoSnapshots.file_hash(db_file),)
+
+    @staticmethod
+    def load(repo: str, db_file: str, file_stat: Tuple[int, int]) -> List['Package']:
+        """
+        Loads the snapshot of a repo
+
+        :param repo:            The name of the repo
+        :param db_file:         The path of the database file of the repo
+        :param file_stat:       The current size and modification time of the database file, see RepoSnapshots.file_stat
+        :return:                The packages of the repo, None if there is no usable snapshot
+        """
+        if not os.path.isfile(RepoSnapshots.snapshot_file(repo)):
+            return None
+
+        try:
+            with open(RepoSnapshots.snapshot_file(repo), 'rb') as f:
+                format_version, snapshot_fingerprint, packages = pickle.load(f)
+        except Exception:
+            logging.debug("Loading snapshot of repo {} failed".format(repo), exc_info=True)
+            return None
+
+        if format_version != RepoSnapshots.format_version or tuple(snapshot_fingerprint[:2]) != file_stat:
+            return None
+
+        # hashing only if the file seems to be unchanged
+        if snapshot_fingerprint[2] != RepoSnapshots.file_hash(db_file):
+            return None
+
+        return packages
+
+    @staticmethod
+    def save(repo: str, fingerprint: Tuple[int, int, str], packages: Sequence['Package']):
+        """
+        Saves the snapshot of a repo.
+        Writes to a temporary file first, so that an aborted write cannot corrupt the snapshot.
+
+        :param repo:            The name of the repo
+        :param fingerprint:     The fingerprint of the database file the packages are from
+        :param packages:        The packages of the repo
+        """
+        snapshot_file = RepoSnapshots.snapshot_file(repo)
+        try:
+            os.makedirs(RepoSnapshots.cache_dir, mode=0o700, exist_ok=True)
+            tmp_file = "{}.tmp".format(snapshot_file)
+            with open(tmp_file, 'wb') as f:
+                pickle.dump((RepoSnapshots.format_version, fingerprint, list(packages)), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, snapshot_file)
+        except OSError:
+            logging.debug("Saving snapshot of repo {} failed".format(repo), exc_info=True)
+
+    @staticmethod
+    def get_repo_packages() -> List['Package']:
+        """
+        Returns the packages of all repos, not yet choosing between packages with the same name from multiple repos.
+        Repos with a usable snapshot are loaded from the snapshot, all others are queried and their snapshot saved.
+
+        :return:    The packages of all repos, ordered by the occurrence of the repos in pacman.conf
+        """
+        handler = PacmanConfig(conf="/etc/pacman.conf").initialize_alpm()
+        repos = [db.name for db in handler.get_syncdbs()]
+
+        packages_of_repos = {}
+        fingerprints = {}
+        for repo in repos:
+            db_file = os.path.join(handler.dbpath, "sync", "{}.db".format(repo))
+            try:
+                packages = RepoSnapshots.load(repo, db_file, RepoSnapshots.file_stat(db_file))
+                if packages is not None:
+                    packages_of_repos[repo] = packages
+                else:
+                    # the fingerprint for the new snapshot, taken before querying the repo
+                    fingerprints[repo] = RepoSnapshots.fingerprint(db_file)
+            except OSError:
+                logging.debug("Fingerprinting {} failed".format(db_file), exc_info=True)
+
+        repos_to_query = [repo for repo in repos if repo not in packages_of_repos]
+        if repos_to_query:
+            logging.debug("Reading the repos {}, using snapshots of the others".format(repos_to_query))
+            queried_packages_of_repos = {repo: [] for repo in repos_to_query}
+            for package in Package.get_packages_from_expac("-S", [], PossibleTypes.REPO_PACKAGE, repos_to_query):
+                queried_packages_of_repos[package.repo].append(package)
+
+            for repo, packages in queried_packages_of_repos.items():
+                packages_of_repos[repo] = packages
+                if repo in fingerprints:
+                    RepoSnapshots.save(repo, fingerprints[repo], packages)
+
+        return [package for repo in repos for package in packages_of_repos[repo]]
+
+
+class PackageUniverse:
+    """
+    Class used to give packages dense integer ids,
+    so that sets of them, e.g. the changes of resulting systems, are ints used as bitsets.
+    Packages are identified like in sets, hence by name and version.
+    """
+
+    def __init__(self):
+        self.packages: List['Package'] = []  # the packages, package ids as indices
+        self.package_ids: Dict['Package', int] = {}  # the packages as keys, package ids as values
+
+    def package_id(self, package: 'Package') -> int:
+        """
+        :param package:     The package
+        :return:            The id of the package, new packages are added to the universe
+        """
+        package_id = self.package_ids.get(package)
+        if package_id is None:
+            package_id = self.package_ids[package] = len(self.packages)
+            self.packages.append(package)
+        return package_id
+
+    def bits_of(self, packages: Iterable['Package']) -> int:
+        """
+        :param packages:    The packages
+        :return:            Bitset of the ids of the packages, new packages are added to the universe
+        """
+        package_ids = self.package_ids
+        bits = 0
+        for package in packages:
+            package_id = package_ids.get(package)
+            if package_id is None:
+                package_id = package_ids[package] = len(self.packages)
+                self.packages.append(package)
+            bits |= 1 << package_id
+        return bits
+
+    def packages_of(self, bits: int) -> Set['Package']:
+        """
+        :param bits:    Bitset of package ids
+        :return:        The packages
+        """
+        return set(self.packages[package_id] for package_id in DepAlgoGraph.ids_of(bits))
+
+
 class System:
     """
     Class representing a "system", which is a collection of Arch Linux packages.
@@ -1283,27 +1999,42 @@ class System:
 
         :return:    A list containing the installed packages
         """
-        repo_packages_names = set(expac("-S", ['n'], []))
+        repo_packages_names = set(record[0] for record in Package.query_databases("-S", ['n'], []))
 
         # packages the user wants to install from aur
         aur_names = packages_from_other_sources()[0]
         repo_packages_names -= aur_names
 
-        installed_packages_names = set(expac("-Q", ['n'], []))
-        installed_repo_packages_names = installed_packages_names & repo_packages_names
-        unclassified_installed_names = installed_packages_names - installed_repo_packages_names
-
-        return_list = []
+        # read all installed packages at once and classify them afterwards
+        installed_packages = Package.get_packages_from_expac("-Q", [], PossibleTypes.PACKAGE_NOT_REPO_NOT_AUR)
 
         # installed repo packages
-        if installed_repo_packages_names:
-            return_list.extend(
-                Package.get_packages_from_expac("-Q", list(installed_repo_packages_names), PossibleTypes.REPO_PACKAGE)
-            )
+        unclassified_installed_packages = []
+        for package in installed_packages:
+            if package.name in repo_packages_names:
+                package.type_of = PossibleTypes.REPO_PACKAGE
+            else:
+                unclassified_installed_packages.append(package)
+
+        # installed packages known to not be in the aur, unless their install dates changed
+        # package names the user gave us have to be asked for anyway
+        install_dates = {}
+        if AurNegativeCache.cache_dir is not None:
+            install_dates = {
+                package.name: package.install_date for package in unclassified_installed_packages
+                if package.name not in aur_names
+            }
+        known_not_aur_names = AurNegativeCache.lookup(install_dates)
+        names_to_ask = set(
+            [package.name for package in unclassified_installed_packages if package.name not in known_not_aur_names]
+        )
 
         # installed aur packages
         installed_aur_packages_names = set(
-            [package.name for package in Package.get_packages_from_aur(list(unclassified_installed_names))]
+            [package.name for package in Package.get_packages_from_aur(list(names_to_ask))]
+        ) if names_to_ask else set()
+        AurNegativeCache.store(
+            {name: install_dates[name] for name in names_to_ask if name in install_dates}, installed_aur_packages_names
         )
 
         # package names the user gave us must be in the aur
@@ -1312,23 +2043,15 @@ class System:
                 aurman_error("Package {} not found in AUR!".format(Colors.BOLD(Colors.LIGHT_MAGENTA(name))))
                 raise InvalidInput("Package {} not found in AUR!".format(Colors.BOLD(Colors.LIGHT_MAGENTA(name))))
 
-        if installed_aur_packages_names:
-            return_list.extend(
-                Package.get_packages_from_expac("-Q", list(installed_aur_packages_names), PossibleTypes.AUR_PACKAGE)
-            )
-
-        unclassified_installed_names -= installed_aur_packages_names
-
-        # installed not repo not aur packages
-        if unclassified_installed_names:
-            return_list.extend(
-                Package.get_packages_from_expac(
-                    "-Q", list(unclassified_installed_names),
-                    PossibleTypes.PACKAGE_NOT_REPO_NOT_AUR
-                )
-            )
+        # the remaining packages are neither repo nor aur packages
+        for package in unclassified_installed_packages:
+            if package.name in installed_aur_packages_names:
+                if is_devel(package.name):
+                    package.type_of = PossibleTypes.DEVEL_PACKAGE
+                else:
+                    package.type_of = PossibleTypes.AUR_PACKAGE
 
-        return return_list
+        return installed_packages
 
     @staticmethod
     def get_repo_packages() -> List['Package']:
@@ -1337,7 +2060,25 @@ class System:
 
         :return:    A list containing the current repo packages
         """
-        return Package.get_packages_from_expac("-S", [], PossibleTypes.REPO_PACKAGE)
+        if RepoSnapshots.cache_dir is None:
+            return Package.get_packages_from_expac("-S", [], PossibleTypes.REPO_PACKAGE)
+
+        return Package.choose_repo_packages(RepoSnapshots.get_repo_packages())
+
+    @staticmethod
+    def get_installed_and_upstream_systems() -> Tuple['System', 'System']:
+        """
+        Loads the system of the installed packages and the system of the current repo packages at the same time.
+        Loading the installed system includes the AUR requests to classify the installed packages,
+        so those run while the repo databases are being read.
+
+        :return:    Tuple containing the installed system and the upstream system
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            installed_future = executor.submit(lambda: System(System.get_installed_packages()))
+            upstream_future = executor.submit(lambda: System(System.get_repo_packages()))
+
+            return installed_future.result(), upstream_future.result()
 
     def __init__(self, packages: Sequence['Package']):
         self.all_packages_dict = {}  # names as keys and packages as values
@@ -1346,15 +2087,55 @@ class System:
         self.devel_packages_list = []  # list containing the aur devel packages
         self.not_repo_not_aur_packages_list = []  # list containing the packages that are neither repo nor aur packages
 
-        # reverse dict for finding providings. names of providings as keys and providing packages as values in lists
+        # reverse dict for finding providings. names of providings as keys and
+        # lists of (providing package, cmp, version) as values
         self.provides_dict = {}
         # same for conflicts
         self.conflicts_dict = {}
+        # same for depends, to find the packages depending on a name. None until needed
+        self.depends_dict = None
+        # packages with unfulfilled depends. None until needed
+        self.unfulfilled_packages = None
+
+        # results of provided_by and conflicting_with, None if the query cache is disabled
+        self.query_cache = None
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
 
         self.append_packages(packages)
 
     def recreate_dicts(self):
+        query_cache_enabled = self.query_cache is not None
         self.__init__(list(self.all_packages_dict.values()))
+        if query_cache_enabled:
+            self.enable_query_cache()
+
+    def enable_query_cache(self):
+        """
+        Caches the results of provided_by and conflicting_with.
+        The cache is cleared by append_packages, remove_packages and recreate_dicts,
+        so do not enable it while changing all_packages_dict directly.
+        """
+        if self.query_cache is None:
+            self.query_cache = {}
+            self.query_cache_hits = 0
+            self.query_cache_misses = 0
+
+    def disable_query_cache(self):
+        """
+        Disables the query cache and logs its hit rate
+        """
+        if self.query_cache is None:
+            return
+
+        queries = self.query_cache_hits + self.query_cache_misses
+        if queries:
+            logging.debug(
+                "Query cache of system with {} packages: {} of {} queries hit ({:.1%})".format(
+                    len(self.all_packages_dict), self.query_cache_hits, queries, self.query_cache_hits / queries
+                )
+            )
+        self.query_cache = None
 
     def append_packages(self, packages: Sequence['Package']):
         """
@@ -1381,19 +2162,129 @@ class System:
 
         self.__append_to_x_dict(packages, 'provides')
         self.__append_to_x_dict(packages, 'conflicts')
+        if self.depends_dict is not None:
+            self.__append_to_x_dict(packages, 'depends')
+        self.unfulfilled_packages = None
+
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def remove_packages(self, packages: Iterable['Package']):
+        """
+        Removes packages from this system.
+        Only the entries of the removed packages are touched, the system is not rebuilt.
+
+        :param packages:    The packages to remove
+        """
+        packages_to_remove = []
+        for package in packages:
+            if package.name not in self.all_packages_dict:
+                logging.error("Package {} not known".format(package))
+                raise InvalidInput("Package {} not known".format(package))
+
+            packages_to_remove.append(self.all_packages_dict.pop(package.name))
+
+        if not packages_to_remove:
+            return
+
+        ids_to_remove = set([id(package) for package in packages_to_remove])
+
+        # only filter the lists of the types of the removed packages
+        types_to_remove = set([package.type_of for package in packages_to_remove])
+        for type_of, list_name in (
+                (PossibleTypes.REPO_PACKAGE, 'repo_packages_list'),
+                (PossibleTypes.AUR_PACKAGE, 'aur_packages_list'),
+                (PossibleTypes.DEVEL_PACKAGE, 'devel_packages_list'),
+                (PossibleTypes.PACKAGE_NOT_REPO_NOT_AUR, 'not_repo_not_aur_packages_list')
+        ):
+            if type_of in types_to_remove:
+                packages_list = getattr(self, list_name)
+                setattr(self, list_name, [package for package in packages_list if id(package) not in ids_to_remove])
+
+        self.__remove_from_x_dict(packages_to_remove, ids_to_remove, 'provides')
+        self.__remove_from_x_dict(packages_to_remove, ids_to_remove, 'conflicts')
+        if self.depends_dict is not None:
+            self.__remove_from_x_dict(packages_to_remove, ids_to_remove, 'depends')
+        self.unfulfilled_packages = None
+
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def __remove_from_x_dict(self, packages: Sequence['Package'], ids_to_remove: Set[int], dict_name: str):
+        dict_to_remove_from = getattr(self, "{}_dict".format(dict_name))
+
+        for value_name in set([value.name for package in packages for value in getattr(package, dict_name) or ()]):
+            entries = [entry for entry in dict_to_remove_from[value_name] if id(entry[0]) not in ids_to_remove]
+            if entries:
+                dict_to_remove_from[value_name] = entries
+            else:
+                del dict_to_remove_from[value_name]
 
     def __append_to_x_dict(self, packages: Sequence['Package'], dict_name: str):
         dict_to_append_to = getattr(self, "{}_dict".format(dict_name))
 
         for package in packages:
-            relevant_package_values = getattr(package, dict_name)
+            relevant_package_values = getattr(package, dict_name) or ()
 
             for relevant_value in relevant_package_values:
-                value_name = strip_versioning_from_name(relevant_value)
+                value_name = relevant_value.name
+                entry = (package, relevant_value.cmp, relevant_value.version)
                 if value_name in dict_to_append_to:
-                    dict_to_append_to[value_name].append(package)
+                    dict_to_append_to[value_name].append(entry)
                 else:
-                    dict_to_append_to[value_name] = [package]
+                    dict_to_append_to[value_name] = [entry]
+
+    def dependents(self, name: str) -> List['Package']:
+        """
+        Packages depending on a name, e.g. on the name of a package or on something a package provides.
+        Only the depends are considered, not the make and check depends.
+
+        :param name:    The name without versioning
+        :return:        List containing the depending packages
+        """
+
+        if self.depends_dict is None:
+            self.depends_dict = {}
+            self.__append_to_x_dict(list(self.all_packages_dict.values()), 'depends')
+
+        return [entry[0] for entry in self.depends_dict.get(name, ())]
+
+    def dependents_of_packages(self, packages: Iterable['Package']) -> List['Package']:
+        """
+        Packages depending on the names of the packages or on something the packages provide.
+        Those are the packages whose deps may not be fulfilled anymore after removing the packages.
+
+        :param packages:    The packages
+        :return:            List containing the depending packages, every package once
+        """
+
+        names = set()
+        for package in packages:
+            names.add(package.name)
+            names.update([providing.name for providing in package.provides])
+
+        dependents = {}
+        for name in names:
+            for package in self.dependents(name):
+                dependents[id(package)] = package
+
+        return list(dependents.values())
+
+    def packages_with_unfulfilled_deps(self) -> List['Package']:
+        """
+        Packages of this system whose depends are not fulfilled.
+        Cached until this system changes.
+
+        :return:    List containing the packages
+        """
+
+        if self.unfulfilled_packages is None:
+            self.unfulfilled_packages = [
+                package for package in self.all_packages_dict.values()
+                if not self.are_all_deps_fulfilled(package, only_depends=True)
+            ]
+
+        return self.unfulfilled_packages
 
     def provided_by(self, dep: str) -> List['Package']:
         """
@@ -1403,7 +2294,21 @@ class System:
         :return:        List containing the providing packages
         """
 
-        dep_name, dep_cmp, dep_version = split_name_with_versioning(dep)
+        if self.query_cache is None:
+            return self.__provided_by(dep)
+
+        key = ("provided_by", dep, Package.optimistic_versioning, Package.ignore_versioning)
+        if key in self.query_cache:
+            self.query_cache_hits += 1
+        else:
+            self.query_cache_misses += 1
+            self.query_cache[key] = self.__provided_by(dep)
+
+        return list(self.query_cache[key])
+
+    def __provided_by(self, dep: str) -> List['Package']:
+        dep = dep_atom(dep)
+        dep_name, dep_cmp, dep_version = dep.name, dep.cmp, dep.version
         return_list = []
 
         if dep_name in self.all_packages_dict:
@@ -1417,28 +2322,21 @@ class System:
                 return_list.append(package)
 
         if dep_name in self.provides_dict:
-            possible_packages = self.provides_dict[dep_name]
-            for package in possible_packages:
+            for package, provide_cmp, provide_version in self.provides_dict[dep_name]:
 
                 if package in return_list:
                     continue
 
-                for provide in package.provides:
-                    provide_name, provide_cmp, provide_version = split_name_with_versioning(provide)
-
-                    if provide_name != dep_name:
-                        continue
-
-                    if not dep_cmp:
-                        return_list.append(package)
-                    elif provide_cmp == "=" and version_comparison(provide_version, dep_cmp, dep_version):
-                        return_list.append(package)
-                    # https://github.com/polygamma/aurman/issues/67
-                    elif not provide_cmp and Package.optimistic_versioning:
-                        return_list.append(package)
-                    # https://github.com/polygamma/aurman/issues/246
-                    elif Package.ignore_versioning:
-                        return_list.append(package)
+                if not dep_cmp:
+                    return_list.append(package)
+                elif provide_cmp == "=" and version_comparison(provide_version, dep_cmp, dep_version):
+                    return_list.append(package)
+                # https://github.com/polygamma/aurman/issues/67
+                elif not provide_cmp and Package.optimistic_versioning:
+                    return_list.append(package)
+                # https://github.com/polygamma/aurman/issues/246
+                elif Package.ignore_versioning:
+                    return_list.append(package)
 
         return return_list
 
@@ -1450,6 +2348,22 @@ class System:
         :return:            List containing the conflicting packages
         """
 
+        if self.query_cache is None:
+            return self.__conflicting_with(package)
+
+        # packages with the same name and version are equal, but may differ in their conflicts and provides,
+        # hence the package is saved together with the result
+        key = ("conflicting_with", package, Package.optimistic_versioning)
+        cached = self.query_cache.get(key)
+        if cached is not None and cached[0] is package:
+            self.query_cache_hits += 1
+        else:
+            self.query_cache_misses += 1
+            cached = self.query_cache[key] = (package, self.__conflicting_with(package))
+
+        return list(cached[1])
+
+    def __conflicting_with(self, package: 'Package') -> List['Package']:
         return_list = []
 
         # ignoring versioning has to be deactivated while checking for conflicts
@@ -1466,30 +2380,22 @@ class System:
 
         provides = list(package.provides)
         for providing in provides[:]:
-            prov_name, prov_cmp, prov_version = split_name_with_versioning(providing)
-            if prov_name == package.name:
+            if providing.name == package.name:
                 provides.remove(providing)
-        provides.append("{}={}".format(package.name, package.version))
+        provides.append(dep_atom("{}={}".format(package.name, package.version)))
 
         for providing in provides:
-            prov_name, prov_cmp, prov_version = split_name_with_versioning(providing)
+            prov_name, prov_cmp, prov_version = providing.name, providing.cmp, providing.version
             if prov_name in self.conflicts_dict:
-                possible_conflict_packages = self.conflicts_dict[prov_name]
-                for possible_conflict_package in possible_conflict_packages:
+                for possible_conflict_package, conflict_cmp, conflict_version in self.conflicts_dict[prov_name]:
 
                     if possible_conflict_package in return_list:
                         continue
 
-                    for conflict in possible_conflict_package.conflicts:
-                        conflict_name, conflict_cmp, conflict_version = split_name_with_versioning(conflict)
-
-                        if conflict_name != prov_name:
-                            continue
-
-                        if not conflict_cmp:
-                            return_list.append(possible_conflict_package)
-                        elif prov_cmp == "=" and version_comparison(prov_version, conflict_cmp, conflict_version):
-                            return_list.append(possible_conflict_package)
+                    if not conflict_cmp:
+                        return_list.append(possible_conflict_package)
+                    elif prov_cmp == "=" and version_comparison(prov_version, conflict_cmp, conflict_version):
+                        return_list.append(possible_conflict_package)
 
         # reset ignoring of versioning
         Package.ignore_versioning = ignore_versioning_copy
@@ -1517,16 +2423,43 @@ class System:
             if package.type_of is not PossibleTypes.AUR_PACKAGE and package.type_of is not PossibleTypes.DEVEL_PACKAGE:
                 packages_names_to_fetch.append(name)
 
-        deleted_while_appending = False
+        # packages fetched from the aur, also containing prefetched packages, which may not be needed
+        prefetched_packages_dict: Dict[str, 'Package'] = {}
+        # names already asked for in the aur
+        asked_names: Set[str] = set()
+        # the deps of the appended packages to record in the dep graph
+        deps_of_appended_packages: Dict[str, List[str]] = {}
+
         while packages_names_to_fetch:
-            fetched_packages = Package.get_packages_from_aur(packages_names_to_fetch)
+            names_to_ask = [name for name in packages_names_to_fetch if name not in asked_names]
+            if names_to_ask:
+                # ask for the probable next levels alongside the current level
+                predicted_names = AurDepGraph.predict(
+                    names_to_ask, lambda name: name in asked_names or name in self.all_packages_dict
+                )
+                if predicted_names:
+                    logging.debug("Prefetching {} probably needed aur packages".format(len(predicted_names)))
+                for package in Package.get_packages_from_aur(names_to_ask + predicted_names):
+                    prefetched_packages_dict[package.name] = package
+                asked_names.update(names_to_ask)
+                asked_names.update(predicted_names)
+
+            # only the packages of the current level are appended
+            current_level_names = set(packages_names_to_fetch)
+            fetched_packages = [
+                package for name, package in prefetched_packages_dict.items() if name in current_level_names
+            ]
 
             deps_of_the_fetched_packages = []
             for package in fetched_packages:
-                deps_of_the_fetched_packages.extend(package.relevant_deps())
+                package_deps = package.relevant_deps()
+                deps_of_the_fetched_packages.extend(package_deps)
+                deps_of_appended_packages[package.name] = sorted(
+                    set([strip_versioning_from_name(dep) for dep in package_deps])
+                )
+                del prefetched_packages_dict[package.name]
                 if package.name in self.all_packages_dict:
-                    del self.all_packages_dict[package.name]
-                    deleted_while_appending = True
+                    self.remove_packages((self.all_packages_dict[package.name],))
 
             self.append_packages(fetched_packages)
 
@@ -1534,8 +2467,7 @@ class System:
 
             packages_names_to_fetch = [dep for dep in relevant_deps if dep not in self.all_packages_dict]
 
-        if deleted_while_appending:
-            self.recreate_dicts()
+        AurDepGraph.record(deps_of_appended_packages)
 
     def are_all_deps_fulfilled(self, package: 'Package', only_make_check: bool = False,
                                only_depends: bool = False, print_reason: bool = False) -> bool:
@@ -1652,12 +2584,17 @@ class System:
         :return:                            the new system
         """
 
-        new_system = System(list(self.all_packages_dict.values()))
+        new_system = OverlaySystem(self)
         if not packages:
             return new_system
 
         informed_about_not_possible: bool = False
 
+        # packages whose deps have to be checked for dependency breakage, ids as keys.
+        # packages whose deps are already not fulfilled on this system, appended packages
+        # and packages depending on removed packages, everything else cannot break
+        packages_to_check = {id(package): package for package in self.packages_with_unfulfilled_deps()}
+
         chunked_packages = System.calc_install_chunks(packages)
         last_index = len(chunked_packages) - 1
 
@@ -1770,15 +2707,16 @@ class System:
                 # remove conflicting packages
                 if conflicting_new_system_packages:
                     deleted_packages = True
-
-                    for package in conflicting_new_system_packages:
-                        del new_system.all_packages_dict[package.name]
-                    new_system = System(list(new_system.all_packages_dict.values()))
+                    new_system.remove_packages(conflicting_new_system_packages)
+                    for package in new_system.dependents_of_packages(conflicting_new_system_packages):
+                        packages_to_check[id(package)] = package
                 else:
                     deleted_packages = False
 
                 # append packages
                 new_system.append_packages(package_chunk)
+                for package in package_chunk:
+                    packages_to_check[id(package)] = package
 
                 # last exit brooklyn
                 # final check for sanity of the whole solution
@@ -1789,7 +2727,12 @@ class System:
                 # delete packages whose deps are not fulfilled anymore
                 while True:
                     to_delete_packages = []
-                    for package in new_system.all_packages_dict.values():
+                    # sorted by names, to print the reasons in a stable order
+                    for package in sorted(packages_to_check.values(), key=lambda to_check: to_check.name):
+                        # may have been removed in the meantime
+                        if new_system.all_packages_dict.get(package.name) is not package:
+                            continue
+
                         if packages_names_print_reason is not None and package.name in packages_names_print_reason:
                             if not new_system.are_all_deps_fulfilled(package, only_depends=True, print_reason=True):
                                 to_delete_packages.append(package)
@@ -1797,6 +2740,7 @@ class System:
                             if not new_system.are_all_deps_fulfilled(package, only_depends=True):
                                 to_delete_packages.append(package)
 
+                    packages_to_check = {}
                     if not to_delete_packages:
                         break
 
@@ -1830,9 +2774,9 @@ class System:
                         )
 
                     # actually delete the packages
-                    for package in to_delete_packages:
-                        del new_system.all_packages_dict[package.name]
-                    new_system = System(list(new_system.all_packages_dict.values()))
+                    new_system.remove_packages(to_delete_packages)
+                    for package in new_system.dependents_of_packages(to_delete_packages):
+                        packages_to_check[id(package)] = package
 
         return new_system
 
@@ -1894,41 +2838,65 @@ class System:
                                                                 same for the uninstalled packages
         """
 
-        differences_tuples = []
-        own_packages = set(self.all_packages_dict.values())
+        universe, differences_bits = self.differences_bits_between_systems(other_systems)
 
-        for other_system in other_systems:
-            current_difference_tuple = (set(), set())
-            differences_tuples.append(current_difference_tuple)
-            other_packages = set(other_system.all_packages_dict.values())
-            difference = own_packages ^ other_packages
-
-            for differ in difference:
-                if differ not in own_packages:
-                    current_difference_tuple[0].add(differ)
-                else:
-                    current_difference_tuple[1].add(differ)
+        installed_in_all, uninstalled_in_all = differences_bits[0]
+        for installed_bits, uninstalled_bits in differences_bits[1:]:
+            installed_in_all &= installed_bits
+            uninstalled_in_all &= uninstalled_bits
 
-        first_return_tuple = (
-            set.intersection(*[difference_tuple[0] for difference_tuple in differences_tuples]),
-            set.intersection(*[difference_tuple[1] for difference_tuple in differences_tuples])
-        )
+        first_return_tuple = (universe.packages_of(installed_in_all), universe.packages_of(uninstalled_in_all))
 
-        return_list = []
+        return_list = [
+            (universe.packages_of(installed_bits & ~installed_in_all),
+             universe.packages_of(uninstalled_bits & ~uninstalled_in_all))
+            for installed_bits, uninstalled_bits in differences_bits
+        ]
 
-        for difference_tuple in differences_tuples:
-            current_tuple = (set(), set())
-            return_list.append(current_tuple)
+        return first_return_tuple, return_list
 
-            for installed_package in difference_tuple[0]:
-                if installed_package not in first_return_tuple[0]:
-                    current_tuple[0].add(installed_package)
+    def differences_bits_between_systems(self, other_systems: Sequence['System']) -> Tuple[
+        'PackageUniverse', List[Tuple[int, int]]]:
+        """
+        Evaluates differences between this (.self) system and other systems as bitsets.
 
-            for uninstalled_package in difference_tuple[1]:
-                if uninstalled_package not in first_return_tuple[1]:
-                    current_tuple[1].add(uninstalled_package)
+        :param other_systems:   The other systems.
+        :return:                Tuple containing two items:
+                                    First item:
+                                        The package universe the bitsets refer to
+                                    Second item:
+                                        List containing for the i-th other system a tuple with two items:
+                                            First item:
+                                                Bitset of the installed packages in comparison to this system
+                                            Second item:
+                                                Bitset of the uninstalled packages in comparison to this system
+        """
 
-        return first_return_tuple, return_list
+        universe = PackageUniverse()
+        differences_bits = []
+        own_packages = None
+
+        for other_system in other_systems:
+            # only the removed and appended packages of overlays of this system may differ
+            if isinstance(other_system, OverlaySystem) and other_system.base_system is self:
+                removed_packages, appended_packages = other_system.removed_and_appended_packages()
+                removed_bits = universe.bits_of(removed_packages)
+                appended_bits = universe.bits_of(appended_packages)
+                # re-appended packages of this system are not installed
+                own_bits = universe.bits_of(
+                    package for package in appended_packages if self.all_packages_dict.get(package.name) == package
+                ) | removed_bits
+                other_bits = appended_bits
+            else:
+                if own_packages is None:
+                    own_packages = set(self.all_packages_dict.values())
+                other_packages = set(other_system.all_packages_dict.values())
+                own_bits = universe.bits_of(own_packages - other_packages)
+                other_bits = universe.bits_of(other_packages - own_packages)
+
+            differences_bits.append((other_bits & ~own_bits, own_bits & ~other_bits))
+
+        return universe, differences_bits
 
     def validate_solutions(self, solutions: List[List['Package']], needed_packages: Sequence['Package']) -> List[
         Tuple['System', List['Package']]]:
@@ -1960,16 +2928,17 @@ class System:
             return []
 
         # calculate the differences between the resulting systems for the valid solutions
-        systems_differences = self.differences_between_systems(
-            [valid_systems_tuple[0] for valid_systems_tuple in valid_systems_tuples])
+        systems_differences_bits = self.differences_bits_between_systems(
+            [valid_systems_tuple[0] for valid_systems_tuple in valid_systems_tuples])[1]
 
         # delete duplicate resulting systems
         return_list = []
         already_seen_differences = set()
         for i, valid_systems_tuple in enumerate(valid_systems_tuples):
-            difference_set = frozenset(set.union(systems_differences[1][i][0], systems_differences[1][i][1]))
-            if difference_set not in already_seen_differences:
-                already_seen_differences.add(difference_set)
+            installed_bits, uninstalled_bits = systems_differences_bits[i]
+            difference_bits = installed_bits | uninstalled_bits
+            if difference_bits not in already_seen_differences:
+                already_seen_differences.add(difference_bits)
                 return_list.append(valid_systems_tuple)
 
         return return_list
@@ -2208,3 +3177,177 @@ class System:
 
         if not noconfirm and not ask_user(user_question, True, True):
             raise InvalidInput()
+
+
+class OverlayPackagesDict(Mapping):
+    """
+    all_packages_dict of an OverlaySystem.
+    The packages of the base system without the removed ones, followed by the appended packages.
+    """
+
+    def __init__(self, overlay_system: 'OverlaySystem'):
+        self.base_dict = overlay_system.base_system.all_packages_dict
+        self.appended_dict = overlay_system.appended_system.all_packages_dict
+        self.removed_names = overlay_system.removed_names
+
+    def __getitem__(self, name: str) -> 'Package':
+        if name in self.appended_dict:
+            return self.appended_dict[name]
+        if name in self.removed_names:
+            raise KeyError(name)
+        return self.base_dict[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self.appended_dict or (name in self.base_dict and name not in self.removed_names)
+
+    def __iter__(self):
+        for name in self.base_dict:
+            if name not in self.removed_names:
+                yield name
+        yield from self.appended_dict
+
+    def __len__(self) -> int:
+        return len(self.base_dict) - len(self.removed_names) + len(self.appended_dict)
+
+
+class OverlayEntriesDict(Mapping):
+    """
+    provides_dict or conflicts_dict of an OverlaySystem.
+    The entries of the base system without the ones of removed packages, followed by the appended entries.
+    """
+
+    def __init__(self, overlay_system: 'OverlaySystem', dict_name: str):
+        self.base_dict = getattr(overlay_system.base_system, "{}_dict".format(dict_name))
+        self.appended_dict = getattr(overlay_system.appended_system, "{}_dict".format(dict_name))
+        self.removed_names = overlay_system.removed_names
+
+    def __getitem__(self, name: str) -> List[Tuple['Package', str, str]]:
+        if name not in self.base_dict:
+            return self.appended_dict[name]
+
+        entries = self.base_dict[name]
+        if self.removed_names:
+            entries = [entry for entry in entries if entry[0].name not in self.removed_names]
+        if name in self.appended_dict:
+            entries = entries + self.appended_dict[name]
+        # like in a System, names without entries are not contained
+        if not entries:
+            raise KeyError(name)
+        return entries
+
+    def __has_base_entries(self, name: str) -> bool:
+        """
+        :param name:    A name contained in the base dict
+        :return:        True if not all base entries of the name belong to removed packages, False otherwise
+        """
+        if not self.removed_names:
+            return True
+        for entry in self.base_dict[name]:
+            if entry[0].name not in self.removed_names:
+                return True
+        return False
+
+    def __contains__(self, name) -> bool:
+        return name in self.appended_dict or (name in self.base_dict and self.__has_base_entries(name))
+
+    def __iter__(self):
+        for name in self.base_dict:
+            if name in self.appended_dict or self.__has_base_entries(name):
+                yield name
+        for name in self.appended_dict:
+            if name not in self.base_dict:
+                yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class OverlaySystem(System):
+    """
+    A system on top of a base system, e.g. the installed system.
+    Only the appended packages and the names of the removed packages of the base system are saved,
+    hence creating and changing an overlay system does not depend on the size of the base system.
+    The base system must not be changed while the overlay system is in use.
+    """
+
+    def __init__(self, base_system: 'System'):
+        self.base_system = base_system
+        self.appended_system = System(())  # the packages appended to this system
+        self.removed_names = set()  # names of the packages of the base system removed from this system
+
+        self.all_packages_dict = OverlayPackagesDict(self)
+        self.provides_dict = OverlayEntriesDict(self, 'provides')
+        self.conflicts_dict = OverlayEntriesDict(self, 'conflicts')
+
+        self.unfulfilled_packages = None
+
+        self.query_cache = None
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+
+    def __packages_list(self, list_name: str) -> List['Package']:
+        return [
+            package for package in getattr(self.base_system, list_name) if package.name not in self.removed_names
+        ] + getattr(self.appended_system, list_name)
+
+    @property
+    def repo_packages_list(self) -> List['Package']:
+        return self.__packages_list('repo_packages_list')
+
+    @property
+    def aur_packages_list(self) -> List['Package']:
+        return self.__packages_list('aur_packages_list')
+
+    @property
+    def devel_packages_list(self) -> List['Package']:
+        return self.__packages_list('devel_packages_list')
+
+    @property
+    def not_repo_not_aur_packages_list(self) -> List['Package']:
+        return self.__packages_list('not_repo_not_aur_packages_list')
+
+    def recreate_dicts(self):
+        # the dicts are views on the base system and the appended packages, nothing to recreate
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def append_packages(self, packages: Sequence['Package']):
+        for package in packages:
+            if package.name in self.all_packages_dict:
+                logging.error("Package {} already known".format(package))
+                raise InvalidInput("Package {} already known".format(package))
+
+        self.appended_system.append_packages(packages)
+        self.unfulfilled_packages = None
+
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def remove_packages(self, packages: Iterable['Package']):
+        appended_packages_to_remove = []
+        for package in packages:
+            if package.name in self.appended_system.all_packages_dict:
+                appended_packages_to_remove.append(package)
+            elif package.name in self.all_packages_dict:
+                self.removed_names.add(package.name)
+            else:
+                logging.error("Package {} not known".format(package))
+                raise InvalidInput("Package {} not known".format(package))
+
+        self.appended_system.remove_packages(appended_packages_to_remove)
+        self.unfulfilled_packages = None
+
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def dependents(self, name: str) -> List['Package']:
+        return [
+            package for package in self.base_system.dependents(name) if package.name not in self.removed_names
+        ] + self.appended_system.dependents(name)
+
+    def removed_and_appended_packages(self) -> Tuple[List['Package'], List['Package']]:
+        """
+        :return:    The removed packages of the base system and the appended packages
+        """
+        return [self.base_system.all_packages_dict[name] for name in self.removed_names], \
+               list(self.appended_system.all_packages_dict.values())
@@ -186,6 +186,8 @@ only_aurman_points.append(HelpOption(["--skip_new_locations"],
                                      "Skips being shown new locations of packages"))
 only_aurman_points.append(HelpOption(["--devel_skip_deps"],
                                      "Skips dependency checks when determining development packages versions"))
+only_aurman_points.append(HelpOption(["--refresh_aur"],
+                                     "Do not use cached AUR package infos"))
 # aurmansolver help
 aurmansolver_help = Help([])
 
@@ -249,3 +251,5 @@ only_solver_points.append(HelpOption(["--show_unkown"],
                                      "in the repos or the aur. Packages will be "
                                      "{} instead of JSON formatted"
                                      .format(Colors.BOLD("new line separated"))))
+only_solver_points.append(HelpOption(["--refresh_aur"],
+                                     "Do not use cached AUR package infos"))
@@ -15,16 +15,17 @@ import requests
 from dateutil.tz import tzlocal
 from pycman.config import PacmanConfig
 
-from aurman.aur_utilities import get_aur_info, AurVars
+from aurman.aur_utilities import get_aur_info, AurVars, AurInfoCache, AurIndex, AurDepGraph, \
+    AurNegativeCache
 from aurman.bash_completion import possible_completions
-from aurman.classes import System, Package, PossibleTypes
+from aurman.classes import System, Package, PossibleTypes, RepoSnapshots
 from aurman.coloring import aurman_error, aurman_status, aurman_note, Colors
 from aurman.help_printing import aurman_help
 from aurman.own_exceptions import InvalidInput, ConnectionProblem
 from aurman.parse_args import PacmanOperations, parse_pacman_args, PacmanArgs
 from aurman.parsing_config import read_config, packages_from_other_sources, AurmanConfig
-from aurman.utilities import acquire_sudo, version_comparison, search_and_print, ask_user, strip_versioning_from_name, \
-    SudoLoop, SearchSortBy
+from aurman.utilities import acquire_sudo, search_and_print, ask_user, strip_versioning_from_name, \
+    SudoLoop, SearchSortBy, VercmpCache
 from aurman.wrappers import pacman, expac
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(module)s - %(funcName)s - %(levelname)s - %(message)s')
@@ -673,6 +674,8 @@ def process(args):
                                 or 'miscellaneous' in AurmanConfig.aurman_config \
                                 and 'ignore_versioning' \
                                 in AurmanConfig.aurman_config['miscellaneous']  # if --ignore_versioning
+    Package.use_pyalpm = 'miscellaneous' in AurmanConfig.aurman_config \
+                         and 'use_pyalpm' in AurmanConfig.aurman_config['miscellaneous']
     packages_of_user_names = list(set(pacman_args.targets))  # targets of the aurman command without duplicates
     sysupgrade = pacman_args.sysupgrade  # if -u or --sysupgrade
     sysupgrade_force = sysupgrade and not isinstance(sysupgrade, bool)  # if -u -u or --sysupgrade --sysupgrade
@@ -784,11 +787,46 @@ def process(args):
             and 'aur_timeout' in AurmanConfig.aurman_config['miscellaneous']:
         AurVars.aur_timeout = int(AurmanConfig.aurman_config['miscellaneous']['aur_timeout'])
 
+    # change number of concurrent aur rpc requests if set by the user
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'aur_threads' in AurmanConfig.aurman_config['miscellaneous']:
+        AurVars.aur_threads = int(AurmanConfig.aurman_config['miscellaneous']['aur_threads'])
+
+    # change number of cached vercmp results if set by the user
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'vercmp_cache_size' in AurmanConfig.aurman_config['miscellaneous']:
+        VercmpCache.size = int(AurmanConfig.aurman_config['miscellaneous']['vercmp_cache_size'])
+
     # set the folder to save `aurman` cache files
     if 'miscellaneous' in AurmanConfig.aurman_config \
             and 'cache_dir' in AurmanConfig.aurman_config['miscellaneous']:
         Package.cache_dir = AurmanConfig.aurman_config['miscellaneous']['cache_dir']
 
+    # cache fetched aur infos in the cache dir
+    AurInfoCache.cache_dir = Package.cache_dir
+    AurDepGraph.cache_dir = Package.cache_dir
+    AurNegativeCache.cache_dir = Package.cache_dir
+    AurInfoCache.refresh = AurNegativeCache.refresh = pacman_args.refresh_aur  # if --refresh_aur
+    # sysupgrades must not miss updates pushed to the aur since the infos have been cached
+    if sysupgrade:
+        AurInfoCache.refresh = True
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'aur_cache_ttl' in AurmanConfig.aurman_config['miscellaneous']:
+        AurInfoCache.ttl = int(AurmanConfig.aurman_config['miscellaneous']['aur_cache_ttl'])
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'not_in_aur_cache_ttl' in AurmanConfig.aurman_config['miscellaneous']:
+        AurNegativeCache.ttl = int(AurmanConfig.aurman_config['miscellaneous']['not_in_aur_cache_ttl'])
+
+    # snapshot the parsed repo packages in the cache dir, unless disabled by the user
+    if 'miscellaneous' not in AurmanConfig.aurman_config \
+            or 'no_repo_snapshots' not in AurmanConfig.aurman_config['miscellaneous']:
+        RepoSnapshots.cache_dir = Package.cache_dir
+
+    # answer aur queries from the local index of the aur if configured by the user
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'aur_index' in AurmanConfig.aurman_config['miscellaneous']:
+        AurIndex.cache_dir = Package.cache_dir
+
     # --- start actually executing things --- #
 
     # if user wants to --clean
@@ -836,9 +874,9 @@ def process(args):
     else:
         aurman_status("initializing {}...".format(Colors.BOLD("aurman")), False)
 
-    # analyzing installed packages
+    # analyzing installed packages and fetching upstream repo packages at the same time
     try:
-        installed_system = System(System.get_installed_packages())
+        installed_system, upstream_system = System.get_installed_and_upstream_systems()
     except InvalidInput:
         sys.exit(1)
 
@@ -860,12 +898,6 @@ def process(args):
         for package in packages_to_show:
             aurman_note("{}".format(Colors.BOLD(Colors.LIGHT_MAGENTA(package))))
 
-    # fetching upstream repo packages...
-    try:
-        upstream_system = System(System.get_repo_packages())
-    except InvalidInput:
-        sys.exit(1)
-
     # fetching needed aur packages
     upstream_system.append_packages_by_name(packages_of_user_names)
     # fetch info for all installed aur packages, too
@@ -927,9 +959,8 @@ def process(args):
                     )
                 )
 
-                upstream_system.all_packages_dict[ignored_packages_name] = installed_system.all_packages_dict[
-                    ignored_packages_name
-                ]
+                upstream_system.remove_packages((upstream_system.all_packages_dict[ignored_packages_name],))
+                upstream_system.append_packages((installed_system.all_packages_dict[ignored_packages_name],))
             else:
                 aurman_note(
                     "{} {} package {}".format(
@@ -939,7 +970,7 @@ def process(args):
                     )
                 )
 
-                del upstream_system.all_packages_dict[ignored_packages_name]
+                upstream_system.remove_packages((upstream_system.all_packages_dict[ignored_packages_name],))
         elif ignored_packages_name in installed_system.all_packages_dict:
             aurman_note(
                 "{} {} package {}".format(
@@ -949,10 +980,6 @@ def process(args):
                 )
             )
 
-    # recreating upstream system
-    if ignored_packages_names:
-        upstream_system = System(list(upstream_system.all_packages_dict.values()))
-
     # if user entered --devel, fetch all needed pkgbuilds etc. for the devel packages
     if devel:
         if not devel_skip_deps:
@@ -1034,7 +1061,7 @@ def process(args):
         for package in possible_packages:
             if package.name in installed_system.all_packages_dict:
                 installed_package = installed_system.all_packages_dict[package.name]
-                if not version_comparison(installed_package.version, "=", package.version):
+                if not installed_package.compare_versions("=", package):
                     concrete_packages_to_install.append(package)
             else:
                 concrete_packages_to_install.append(package)
@@ -1055,12 +1082,12 @@ def process(args):
             upstream_package = upstream_system.all_packages_dict[package.name]
             # normal sysupgrade
             if not sysupgrade_force:
-                if version_comparison(upstream_package.version, ">", package.version):
+                if upstream_package.compare_versions(">", package):
                     if upstream_package not in concrete_packages_to_install:
                         concrete_packages_to_install.append(upstream_package)
             # sysupgrade with downgrades
             else:
-                if not version_comparison(upstream_package.version, "=", package.version):
+                if not upstream_package.compare_versions("=", package):
                     if upstream_package not in concrete_packages_to_install:
                         concrete_packages_to_install.append(upstream_package)
 
@@ -1162,6 +1189,8 @@ def process(args):
             aurman_error("if you think that there should be one, rerun aurman with the --deep_search flag")
         sys.exit(1)
 
+    VercmpCache.log_info()
+
     # needed because deep_search ignores installed packages
     if not only_unfulfilled_deps:
         pacman_args.needed = True
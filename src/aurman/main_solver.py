@@ -7,14 +7,15 @@ from typing import Sequence, Set, Dict, List
 
 from pycman.config import PacmanConfig
 
-from aurman.aur_utilities import AurVars
-from aurman.classes import System, Package, PossibleTypes
+from aurman.aur_utilities import AurVars, AurInfoCache, AurIndex, AurDepGraph, \
+    AurNegativeCache
+from aurman.classes import System, Package, PossibleTypes, RepoSnapshots
 from aurman.coloring import aurman_error, aurman_note, Colors
 from aurman.help_printing import aurmansolver_help
 from aurman.own_exceptions import InvalidInput
 from aurman.parse_args import parse_pacman_args, PacmanOperations
 from aurman.parsing_config import read_config, AurmanConfig
-from aurman.utilities import version_comparison, strip_versioning_from_name
+from aurman.utilities import strip_versioning_from_name, VercmpCache
 from aurman.wrappers import makepkg
 
 # you may want to switch to logging.DEBUG
@@ -137,7 +138,7 @@ class SolutionEncoder(json.JSONEncoder):
         if isinstance(obj, set):
             return list(obj)
         if isinstance(obj, Package):
-            return obj.__dict__
+            return obj.as_dict()
         return json.JSONEncoder.default(self, obj)
 
 
@@ -169,6 +170,8 @@ def process(args):
                                 or 'miscellaneous' in AurmanConfig.aurman_config \
                                 and 'ignore_versioning' \
                                 in AurmanConfig.aurman_config['miscellaneous']  # if --ignore_versioning
+    Package.use_pyalpm = 'miscellaneous' in AurmanConfig.aurman_config \
+                         and 'use_pyalpm' in AurmanConfig.aurman_config['miscellaneous']
     packages_of_user_names = list(set(pacman_args.targets))  # targets of the aurman command without duplicates
     sysupgrade = pacman_args.sysupgrade  # if -u or --sysupgrade
     sysupgrade_force = sysupgrade and not isinstance(sysupgrade, bool)  # if -u -u or --sysupgrade --sysupgrade
@@ -219,9 +222,53 @@ def process(args):
             and 'aur_timeout' in AurmanConfig.aurman_config['miscellaneous']:
         AurVars.aur_timeout = int(AurmanConfig.aurman_config['miscellaneous']['aur_timeout'])
 
-    # analyzing installed packages
+    # change number of concurrent aur rpc requests if set by the user
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'aur_threads' in AurmanConfig.aurman_config['miscellaneous']:
+        AurVars.aur_threads = int(AurmanConfig.aurman_config['miscellaneous']['aur_threads'])
+
+    # change number of cached vercmp results if set by the user
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'vercmp_cache_size' in AurmanConfig.aurman_config['miscellaneous']:
+        VercmpCache.size = int(AurmanConfig.aurman_config['miscellaneous']['vercmp_cache_size'])
+
+    # set the folder to save `aurman` cache files
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'cache_dir' in AurmanConfig.aurman_config['miscellaneous']:
+        Package.cache_dir = AurmanConfig.aurman_config['miscellaneous']['cache_dir']
+
+    # cache fetched aur infos in the cache dir
+    AurInfoCache.cache_dir = Package.cache_dir
+    AurDepGraph.cache_dir = Package.cache_dir
+    AurNegativeCache.cache_dir = Package.cache_dir
+    AurInfoCache.refresh = AurNegativeCache.refresh = pacman_args.refresh_aur  # if --refresh_aur
+    # sysupgrades must not miss updates pushed to the aur since the infos have been cached
+    if sysupgrade:
+        AurInfoCache.refresh = True
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'aur_cache_ttl' in AurmanConfig.aurman_config['miscellaneous']:
+        AurInfoCache.ttl = int(AurmanConfig.aurman_config['miscellaneous']['aur_cache_ttl'])
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'not_in_aur_cache_ttl' in AurmanConfig.aurman_config['miscellaneous']:
+        AurNegativeCache.ttl = int(AurmanConfig.aurman_config['miscellaneous']['not_in_aur_cache_ttl'])
+
+    # snapshot the parsed repo packages in the cache dir, unless disabled by the user
+    if 'miscellaneous' not in AurmanConfig.aurman_config \
+            or 'no_repo_snapshots' not in AurmanConfig.aurman_config['miscellaneous']:
+        RepoSnapshots.cache_dir = Package.cache_dir
+
+    # answer aur queries from the local index of the aur if configured by the user
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'aur_index' in AurmanConfig.aurman_config['miscellaneous']:
+        AurIndex.cache_dir = Package.cache_dir
+
+    # analyzing installed packages and fetching upstream repo packages at the same time
+    # --show_unknown only needs the installed packages
     try:
-        installed_system = System(System.get_installed_packages())
+        if pacman_args.show_unknown:
+            installed_system = System(System.get_installed_packages())
+        else:
+            installed_system, upstream_system = System.get_installed_and_upstream_systems()
     except InvalidInput:
         sys.exit(1)
 
@@ -249,12 +296,6 @@ def process(args):
     if pacman_args.show_unknown:
         sys.exit(0)
 
-    # fetching upstream repo packages...
-    try:
-        upstream_system = System(System.get_repo_packages())
-    except InvalidInput:
-        sys.exit(1)
-
     # fetching needed aur packages
     if not repo:
         upstream_system.append_packages_by_name(packages_of_user_names)
@@ -265,9 +306,7 @@ def process(args):
 
     # remove known repo packages in case of --aur
     if aur:
-        for package in upstream_system.repo_packages_list:
-            del upstream_system.all_packages_dict[package.name]
-        upstream_system = System(list(upstream_system.all_packages_dict.values()))
+        upstream_system.remove_packages(list(upstream_system.repo_packages_list))
 
     # sanitize user input
     sanitized_names = sanitize_user_input(packages_of_user_names, upstream_system)
@@ -301,23 +340,19 @@ def process(args):
                                                         Colors.BOLD(Colors.LIGHT_CYAN("installed")),
                                                         Colors.BOLD(Colors.LIGHT_MAGENTA(ignored_packages_name))))
 
-                upstream_system.all_packages_dict[ignored_packages_name] = installed_system.all_packages_dict[
-                    ignored_packages_name]
+                upstream_system.remove_packages((upstream_system.all_packages_dict[ignored_packages_name],))
+                upstream_system.append_packages((installed_system.all_packages_dict[ignored_packages_name],))
             else:
                 logging.debug("{} {} package {}".format(Colors.BOLD(Colors.LIGHT_MAGENTA("Ignoring")),
                                                         Colors.BOLD(Colors.LIGHT_BLUE("upstream ")),
                                                         Colors.BOLD(Colors.LIGHT_MAGENTA(ignored_packages_name))))
 
-                del upstream_system.all_packages_dict[ignored_packages_name]
+                upstream_system.remove_packages((upstream_system.all_packages_dict[ignored_packages_name],))
         elif ignored_packages_name in installed_system.all_packages_dict:
             logging.debug("{} {} package {}".format(Colors.BOLD(Colors.LIGHT_MAGENTA("Ignoring")),
                                                     Colors.BOLD(Colors.LIGHT_CYAN("installed")),
                                                     Colors.BOLD(Colors.LIGHT_MAGENTA(ignored_packages_name))))
 
-    # recreating upstream system
-    if ignored_packages_names:
-        upstream_system = System(list(upstream_system.all_packages_dict.values()))
-
     # if user entered --devel and not --repo, fetch all current versions of devel packages
     if devel and not repo:
         for package in upstream_system.devel_packages_list:
@@ -341,7 +376,7 @@ def process(args):
         for package in possible_packages:
             if package.name in installed_system.all_packages_dict:
                 installed_package = installed_system.all_packages_dict[package.name]
-                if not version_comparison(installed_package.version, "=", package.version):
+                if not installed_package.compare_versions("=", package):
                     concrete_packages_to_install.append(package)
             else:
                 concrete_packages_to_install.append(package)
@@ -364,12 +399,12 @@ def process(args):
             upstream_package = upstream_system.all_packages_dict[package.name]
             # normal sysupgrade
             if not sysupgrade_force:
-                if version_comparison(upstream_package.version, ">", package.version):
+                if upstream_package.compare_versions(">", package):
                     if upstream_package not in concrete_packages_to_install:
                         concrete_packages_to_install.append(upstream_package)
             # sysupgrade with downgrades
             else:
-                if not version_comparison(upstream_package.version, "=", package.version):
+                if not upstream_package.compare_versions("=", package):
                     if upstream_package not in concrete_packages_to_install:
                         concrete_packages_to_install.append(upstream_package)
 
@@ -451,6 +486,8 @@ def process(args):
         aurman_error("if you think that there should be one, rerun aurman with the --deep_search flag")
         sys.exit(1)
 
+    VercmpCache.log_info()
+
     print(
         json.dumps(
             [valid_solutions, installed_system.differences_between_systems([sol_tuple[0] for sol_tuple in sol_tuples])],
@@ -84,7 +84,8 @@ pacman_options = {
     "rebuild": ("rebuild", 0, (PacmanOperations.AURMAN,), False, False),
     "skip_news": ("skip_news", 0, (PacmanOperations.AURMAN,), False, False),
     "skip_new_locations": ("skip_new_locations", 0, (PacmanOperations.AURMAN,), False, False),
-    "devel_skip_deps": ("devel_skip_deps", 0, (PacmanOperations.AURMAN,), False, False)
+    "devel_skip_deps": ("devel_skip_deps", 0, (PacmanOperations.AURMAN,), False, False),
+    "refresh_aur": ("refresh_aur", 0, (PacmanOperations.AURMAN,), False, False)
 }
 
 pacman_operations = {
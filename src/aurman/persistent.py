@@ -0,0 +1,320 @@
+from collections.abc import Mapping
+from typing import Any, Iterator, Tuple, Union
+
+# number of hash bits consumed per level of the hash array mapped trie
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+# bits of the hashes being used, hashes equal in those bits end up in a collision node
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+
+def _key_hash(key: Any) -> int:
+    """
+    :param key:     The key
+    :return:        The non negative hash of the key used in the trie
+    """
+    return hash(key) & _HASH_MASK
+
+
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count
+else:
+    def _popcount(bits: int) -> int:
+        """
+        :param bits:    The bits
+        :return:        The number of set bits
+        """
+        return bin(bits).count("1")
+
+
+class PersistentList:
+    """
+    Immutable cons list.
+    Appending returns a new list sharing all items with the old one, so copying a list is free.
+    The last appended item is the head of the list, iterating yields the items in the order of appending.
+    """
+
+    __slots__ = ('head', 'tail', 'length')
+
+    def __init__(self, head: Any = None, tail: Union['PersistentList', None] = None):
+        self.head = head  # the last appended item
+        self.tail: Union['PersistentList', None] = tail  # the list before appending the head, None for empty lists
+        self.length: int = 0 if tail is None else tail.length + 1
+
+    def append(self, item: Any) -> 'PersistentList':
+        """
+        :param item:    The item to append
+        :return:        New list with the item appended
+        """
+        return PersistentList(item, self)
+
+    def remove(self, item: Any) -> 'PersistentList':
+        """
+        Removes the last appended occurrence of an item.
+        Only the items appended after that occurrence are copied.
+
+        :param item:    The item to remove
+        :return:        New list without the item
+        """
+        newer_items = []
+        current = self
+        while current.tail is not None:
+            if current.head == item:
+                new_list = current.tail
+                for newer_item in reversed(newer_items):
+                    new_list = new_list.append(newer_item)
+                return new_list
+            newer_items.append(current.head)
+            current = current.tail
+        raise ValueError("{} not in list".format(item))
+
+    def __reversed__(self) -> Iterator[Any]:
+        current = self
+        while current.tail is not None:
+            yield current.head
+            current = current.tail
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(reversed(self))[::-1])
+
+    def __contains__(self, item: Any) -> bool:
+        for own_item in reversed(self):
+            if own_item == item:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __repr__(self) -> str:
+        return "PersistentList({})".format(list(self))
+
+
+class _TrieNode:
+    """
+    Node of the hash array mapped trie.
+    The entries are (key, value) tuples or child nodes, one for every bit set in the bitmap.
+    """
+
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap: int, entries: Tuple):
+        self.bitmap: int = bitmap
+        self.entries: Tuple = entries
+
+
+class _CollisionNode:
+    """
+    Node containing the (key, value) tuples of keys with the same hash
+    """
+
+    __slots__ = ('entries',)
+
+    def __init__(self, entries: Tuple):
+        self.entries: Tuple = entries
+
+
+_nodes = (_TrieNode, _CollisionNode)
+_missing = object()
+
+
+def _node_get(node: Union[_TrieNode, _CollisionNode], key: Any, key_hash: int, shift: int) -> Any:
+    """
+    :return:    The value of the key, _missing if the key is not contained
+    """
+    while True:
+        if isinstance(node, _CollisionNode):
+            for entry_key, entry_value in node.entries:
+                if entry_key == key:
+                    return entry_value
+            return _missing
+
+        bit = 1 << ((key_hash >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return _missing
+
+        entry = node.entries[_popcount(node.bitmap & (bit - 1))]
+        if isinstance(entry, _nodes):
+            node = entry
+            shift += _BITS
+            continue
+
+        if entry[0] == key:
+            return entry[1]
+        return _missing
+
+
+def _merge_entries(entry1: Tuple, hash1: int, entry2: Tuple, hash2: int, shift: int) -> Union[_TrieNode,
+                                                                                              _CollisionNode]:
+    """
+    :return:    A node containing both entries
+    """
+    if shift >= _HASH_BITS:
+        return _CollisionNode((entry1, entry2))
+
+    index1 = (hash1 >> shift) & _MASK
+    index2 = (hash2 >> shift) & _MASK
+    if index1 == index2:
+        return _TrieNode(1 << index1, (_merge_entries(entry1, hash1, entry2, hash2, shift + _BITS),))
+    if index1 < index2:
+        return _TrieNode((1 << index1) | (1 << index2), (entry1, entry2))
+    return _TrieNode((1 << index1) | (1 << index2), (entry2, entry1))
+
+
+def _node_set(node: Union[_TrieNode, _CollisionNode], key: Any, key_hash: int, value: Any,
+              shift: int) -> Tuple[Union[_TrieNode, _CollisionNode], bool]:
+    """
+    :return:    Tuple containing the new node and if the key has been added
+    """
+    if isinstance(node, _CollisionNode):
+        for i, (entry_key, entry_value) in enumerate(node.entries):
+            if entry_key == key:
+                if entry_value is value:
+                    return node, False
+                return _CollisionNode(node.entries[:i] + ((key, value),) + node.entries[i + 1:]), False
+        return _CollisionNode(node.entries + ((key, value),)), True
+
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+
+    if not node.bitmap & bit:
+        return _TrieNode(node.bitmap | bit, entries[:index] + ((key, value),) + entries[index:]), True
+
+    entry = entries[index]
+    if isinstance(entry, _nodes):
+        new_entry, added = _node_set(entry, key, key_hash, value, shift + _BITS)
+        if new_entry is entry:
+            return node, False
+    elif entry[0] == key:
+        if entry[1] is value:
+            return node, False
+        new_entry, added = (key, value), False
+    else:
+        new_entry = _merge_entries(entry, _key_hash(entry[0]), (key, value), key_hash, shift + _BITS)
+        added = True
+
+    return _TrieNode(node.bitmap, entries[:index] + (new_entry,) + entries[index + 1:]), added
+
+
+def _node_delete(node: Union[_TrieNode, _CollisionNode], key: Any, key_hash: int,
+                 shift: int) -> Union[_TrieNode, _CollisionNode, Tuple, None]:
+    """
+    :return:    The new node, the same node if the key is not contained.
+                A remaining single (key, value) tuple instead of a node and None if nothing remains.
+    """
+    if isinstance(node, _CollisionNode):
+        entries = tuple(entry for entry in node.entries if entry[0] != key)
+        if len(entries) == len(node.entries):
+            return node
+        if len(entries) == 1:
+            return entries[0]
+        return _CollisionNode(entries)
+
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+    entry = entries[index]
+    if isinstance(entry, _nodes):
+        new_entry = _node_delete(entry, key, key_hash, shift + _BITS)
+        if new_entry is entry:
+            return node
+    elif entry[0] == key:
+        new_entry = None
+    else:
+        return node
+
+    if new_entry is not None:
+        # single remaining entries of child nodes are moved up, unless they are the only entry
+        if len(entries) == 1 and not isinstance(new_entry, _nodes) and shift:
+            return new_entry
+        return _TrieNode(node.bitmap, entries[:index] + (new_entry,) + entries[index + 1:])
+
+    entries = entries[:index] + entries[index + 1:]
+    if not entries:
+        return None
+    if len(entries) == 1 and not isinstance(entries[0], _nodes) and shift:
+        return entries[0]
+    return _TrieNode(node.bitmap ^ bit, entries)
+
+
+def _node_items(node: Union[_TrieNode, _CollisionNode]) -> Iterator[Tuple]:
+    """
+    :return:    The (key, value) tuples contained in the node
+    """
+    for entry in node.entries:
+        if isinstance(entry, _nodes):
+            yield from _node_items(entry)
+        else:
+            yield entry
+
+
+class PersistentMap(Mapping):
+    """
+    Immutable map implemented as hash array mapped trie.
+    Setting or deleting keys returns a new map sharing all untouched nodes with the old one,
+    so copying a map is free and changing it costs O(log n).
+    """
+
+    __slots__ = ('_root', '_length')
+
+    def __init__(self, root: Union[_TrieNode, None] = None, length: int = 0):
+        self._root: Union[_TrieNode, None] = root
+        self._length: int = length
+
+    def set(self, key: Any, value: Any) -> 'PersistentMap':
+        """
+        :param key:     The key
+        :param value:   The value
+        :return:        New map with the key mapped to the value
+        """
+        if self._root is None:
+            return PersistentMap(_TrieNode(1 << (_key_hash(key) & _MASK), ((key, value),)), 1)
+
+        new_root, added = _node_set(self._root, key, _key_hash(key), value, 0)
+        if new_root is self._root:
+            return self
+        return PersistentMap(new_root, self._length + 1 if added else self._length)
+
+    def delete(self, key: Any) -> 'PersistentMap':
+        """
+        :param key:     The key, has to be contained
+        :return:        New map without the key
+        """
+        if self._root is not None:
+            new_root = _node_delete(self._root, key, _key_hash(key), 0)
+            if new_root is not self._root:
+                return PersistentMap(new_root, self._length - 1)
+        raise KeyError(key)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if self._root is None:
+            return default
+        value = _node_get(self._root, key, _key_hash(key), 0)
+        if value is _missing:
+            return default
+        return value
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key, _missing) is not _missing
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._root is not None:
+            for key, value in _node_items(self._root):
+                yield key
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __repr__(self) -> str:
+        return "PersistentMap({})".format(dict(self))
@@ -5,9 +5,10 @@ import threading
 import time
 import tty
 from enum import Enum, auto
+from functools import lru_cache
 from pyalpm import vercmp
 from subprocess import run
-from typing import Tuple, Sequence
+from typing import Tuple, Sequence, Dict, Union
 
 import regex
 
@@ -22,6 +23,35 @@ class SudoLoop:
     timeout: int = 120
 
 
+class VercmpCache:
+    # max number of cached vercmp results, 0 disables the cache
+    size: int = 65536
+    # vercmp wrapped in an lru cache of the size above, created on first use
+    cached_vercmp = None
+
+    @staticmethod
+    def vercmp(version1: str, version2: str) -> int:
+        """
+        vercmp of pyalpm with the results being cached
+
+        :param version1:    Version1
+        :param version2:    Version2
+        :return:            < 0 if version1 is older, 0 if they are equal, > 0 if version1 is newer
+        """
+        if VercmpCache.cached_vercmp is None:
+            VercmpCache.cached_vercmp = lru_cache(maxsize=VercmpCache.size)(lambda v1, v2: int(vercmp(v1, v2)))
+
+        return VercmpCache.cached_vercmp(version1, version2)
+
+    @staticmethod
+    def log_info():
+        """
+        Logs the hits and misses of the cache
+        """
+        if VercmpCache.cached_vercmp is not None:
+            logging.debug("vercmp cache: {}".format(VercmpCache.cached_vercmp.cache_info()))
+
+
 class SearchSortBy(Enum):
     # values to sort the -Ss results by
     NAME = auto()
@@ -134,6 +164,60 @@ def search_and_print(names: Sequence[str], installed_system, pacman_params: 'Pac
             print("    {}".format(ret_dict['Description']))
 
 
+class DepAtom(str):
+    """
+    A name with versioning, e.g. "gunnar>=1.3.3.7", which knows its parts.
+    Get instances via dep_atom, so that every string is only parsed once.
+    """
+
+    def __new__(cls, name: str):
+        atom = super().__new__(cls, name)
+
+        comparison_operators = (">", "<", "=")
+        start_operator = len(name)
+        end_operator = -1
+
+        for comparison_operator in comparison_operators:
+            if comparison_operator in name:
+                index = name.index(comparison_operator)
+                if index < start_operator:
+                    start_operator = index
+                if index > end_operator:
+                    end_operator = index
+
+        atom.name = sys.intern(name[:start_operator])  # e.g. "gunnar"
+        atom.cmp = name[start_operator:end_operator + 1]  # e.g. ">="
+        atom.version = name[max(end_operator + 1, start_operator):]  # e.g. "1.3.3.7"
+        atom.parts = (atom.name, atom.cmp, atom.version)
+        return atom
+
+    def __reduce__(self):
+        return dep_atom, (str(self),)
+
+
+# all parsed names with versioning, the strings as keys, the DepAtoms as values
+dep_atoms: Dict[str, 'DepAtom'] = {}
+
+
+def dep_atom(name: str) -> 'DepAtom':
+    """
+    Returns the DepAtom of a name with versioning.
+    Every string is only parsed once.
+
+    :param name:    the name with versioning
+    :return:        the DepAtom
+    """
+    if type(name) is DepAtom:
+        return name
+
+    atom = dep_atoms.get(name)
+    if atom is None:
+        atom = DepAtom(name)
+        dep_atoms[name] = atom
+
+    return atom
+
+
 def split_name_with_versioning(name: str) -> Tuple[str, str, str]:
     """
     Splits name with versioning into its parts.
@@ -144,19 +228,7 @@ def split_name_with_versioning(name: str) -> Tuple[str, str, str]:
                     (name, comparison-operator, version)
     """
 
-    comparison_operators = (">", "<", "=")
-    start_operator = len(name)
-    end_operator = -1
-
-    for comparison_operator in comparison_operators:
-        if comparison_operator in name:
-            index = name.index(comparison_operator)
-            if index < start_operator:
-                start_operator = index
-            if index > end_operator:
-                end_operator = index
-
-    return name[:start_operator], name[start_operator:end_operator + 1], name[max(end_operator + 1, start_operator):]
+    return dep_atom(name).parts
 
 
 def strip_versioning_from_name(name: str) -> str:
@@ -168,7 +240,7 @@ def strip_versioning_from_name(name: str) -> str:
     :return:        the name without versioning
     """
 
-    return split_name_with_versioning(name)[0]
+    return dep_atom(name).name
 
 
 def version_comparison(version1: str, comparison_operator: str, version2: str) -> bool:
@@ -182,7 +254,7 @@ def version_comparison(version1: str, comparison_operator: str, version2: str) -
     :return:                        True if the conditional relationship holds, False otherwise
     """
 
-    vercmp_return = int(vercmp(version1, version2))
+    vercmp_return = VercmpCache.vercmp(version1, version2)
 
     if vercmp_return < 0:
         return "<" in comparison_operator
@@ -192,6 +264,100 @@ def version_comparison(version1: str, comparison_operator: str, version2: str) -
         return ">" in comparison_operator
 
 
+# segments of a version as compared by vercmp: separators followed by either digits or letters
+version_segment_regex = regex.compile(rb"([^0-9A-Za-z]*)(?:([0-9]+)|([A-Za-z]+))")
+
+
+def version_part_key(version_part: bytes) -> Union[Tuple, None]:
+    """
+    Sortable key of a part of a version (epoch, pkgver or pkgrel) as compared by rpmvercmp of libalpm.
+
+    :param version_part:    The part of the version
+    :return:                The key, None if the part ends with separators
+    """
+
+    key = []
+    end = 0
+    for match in version_segment_regex.finditer(version_part):
+        separators, digits, letters = match.groups()
+        # more separators before a segment win, then digits win over letters
+        if digits is not None:
+            digits = digits.lstrip(b"0")
+            key.append((2, len(separators), 1, len(digits), digits))
+        elif separators:
+            key.append((2, len(separators), 0, letters))
+        # letters directly after a segment are older than the end of a version, e.g. "1.0a" < "1.0"
+        else:
+            key.append((0, letters))
+        end = match.end()
+
+    # trailing separators make vercmp depend on the other version, e.g. "a." < "a1" < "a.b" < "a."
+    if end != len(version_part):
+        return None
+
+    key.append((1,))
+    return tuple(key)
+
+
+def version_key(version: str) -> Tuple:
+    """
+    Sortable key of a version of the form epoch:pkgver-pkgrel.
+    Comparing the keys of two versions gives the same result as vercmp.
+
+    vercmp is no total order, since pkgrels are only compared if both versions have one
+    and trailing separators are special, so for such versions there is no key.
+
+    :param version:     The version
+    :return:            The key, an empty tuple if there is no key
+    """
+
+    version = version.encode()
+
+    # split like libalpm
+    epoch_end = len(version) - len(version.lstrip(b"0123456789"))
+    pkgrel_start = version.rfind(b"-", epoch_end)
+    if pkgrel_start == -1:
+        return ()
+
+    if version[epoch_end:epoch_end + 1] == b":":
+        epoch = version[:epoch_end] or b"0"
+        pkgver = version[epoch_end + 1:pkgrel_start]
+    else:
+        epoch = b"0"
+        pkgver = version[:pkgrel_start]
+    pkgrel = version[pkgrel_start + 1:]
+
+    keys = tuple([version_part_key(part) for part in (epoch, pkgver, pkgrel)])
+    if None in keys:
+        return ()
+
+    return keys
+
+
+def version_comparison_by_keys(version1: str, comparison_operator: str, version2: str,
+                               key1: Tuple, key2: Tuple) -> bool:
+    """
+    Compares two versions by their version_key, uses vercmp if one of them has no key.
+
+    :param version1:                Version1
+    :param comparison_operator:     Comparison operator
+    :param version2:                Version2
+    :param key1:                    version_key of version1
+    :param key2:                    version_key of version2
+    :return:                        True if the conditional relationship holds, False otherwise
+    """
+
+    if not key1 or not key2:
+        return version_comparison(version1, comparison_operator, version2)
+
+    if key1 < key2:
+        return "<" in comparison_operator
+    elif key1 == key2:
+        return "=" in comparison_operator
+    else:
+        return ">" in comparison_operator
+
+
 def acquire_sudo():
     """
     sudo loop since we want sudo forever
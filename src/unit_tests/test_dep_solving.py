@@ -0,0 +1,132 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import TestCase, main, skipIf
+
+try:
+    from aurman.classes import Package, System, PossibleTypes
+except ImportError:
+    Package = None
+
+
+def package(name, version, **kwargs):
+    for field in ("depends", "conflicts", "optdepends", "provides", "replaces", "makedepends", "checkdepends",
+                  "groups"):
+        kwargs.setdefault(field, [])
+    return Package(name=name, version=version, pkgbase=name, **kwargs)
+
+
+def aur_package(name, version="1.0-1", **kwargs):
+    return package(name, version, type_of=PossibleTypes.AUR_PACKAGE, **kwargs)
+
+
+def repo_package(name, version="1.0-1", **kwargs):
+    return package(name, version, type_of=PossibleTypes.REPO_PACKAGE, repo="core", **kwargs)
+
+
+def names(packages):
+    return [package.name for package in packages]
+
+
+@skipIf(Package is None, "pyalpm not available")
+class TestDep_solving(TestCase):
+    def setUp(self):
+        Package.optimistic_versioning = False
+        Package.ignore_versioning = False
+
+    def solve(self, targets, installed_system, upstream_system):
+        # problems are printed if there are no solutions
+        with redirect_stdout(StringIO()):
+            return Package.dep_solving(targets, installed_system, upstream_system)
+
+    def test_dep_cycle(self):
+        # dep cycles of aur packages cannot be solved
+        aur_a = aur_package("aur_a", depends=["aur_b"])
+        aur_b = aur_package("aur_b", depends=["aur_a"])
+        self.assertEqual([], self.solve([aur_a], System([]), System([aur_a, aur_b])))
+
+        # pacman handles dep cycles of repo packages
+        repo_a = repo_package("repo_a", depends=["repo_b"])
+        repo_b = repo_package("repo_b", depends=["repo_a"])
+        solutions = self.solve([repo_a], System([]), System([repo_a, repo_b]))
+        self.assertEqual([["repo_b", "repo_a"]], [names(solution) for solution in solutions])
+
+    def test_conflict(self):
+        installed_old = repo_package("old")
+        installed_user = repo_package("user")
+        installed_system = System([installed_old, installed_user])
+
+        # conflicting with an installed package replaces it
+        new = aur_package("new", depends=["dep"], conflicts=["old"])
+        dep = repo_package("dep")
+        upstream_system = System([new, dep])
+        solutions = self.solve([new], installed_system, upstream_system)
+        self.assertEqual([["dep", "new"]], [names(solution) for solution in solutions])
+
+        valid_systems_tuples = installed_system.validate_solutions(solutions, [new])
+        self.assertEqual(1, len(valid_systems_tuples))
+        self.assertEqual(
+            {"user", "new", "dep"}, set(valid_systems_tuples[0][0].all_packages_dict)
+        )
+
+        differences = installed_system.differences_between_systems([valid_systems_tuples[0][0]])
+        self.assertEqual(({new, dep}, {installed_old}), differences[0])
+        self.assertEqual([(set(), set())], differences[1])
+
+        # conflicting deps of the same package cannot be solved
+        both = aur_package("both", depends=["left", "right"])
+        left = repo_package("left", conflicts=["right"])
+        right = repo_package("right")
+        self.assertEqual([], self.solve([both], installed_system, System([both, left, right])))
+
+    def test_versioned_provider(self):
+        app = aur_package("app", depends=["virtual>=2"])
+        old_provider = repo_package("old_provider", provides=["virtual=1"])
+        new_provider = repo_package("new_provider", provides=["virtual=2"])
+        other_provider = repo_package("other_provider", provides=["virtual=3"])
+        installed_system = System([])
+        upstream_system = System([app, old_provider, new_provider, other_provider])
+
+        solutions = self.solve([app], installed_system, upstream_system)
+        self.assertEqual(
+            [["new_provider", "app"], ["other_provider", "app"]],
+            sorted(names(solution) for solution in solutions)
+        )
+
+        # both solutions are valid and differ only in the provider
+        valid_systems_tuples = installed_system.validate_solutions(solutions, [app])
+        self.assertEqual(2, len(valid_systems_tuples))
+        differences = installed_system.differences_between_systems(
+            [valid_systems_tuple[0] for valid_systems_tuple in valid_systems_tuples]
+        )
+        self.assertEqual(({app}, set()), differences[0])
+        self.assertEqual(
+            [{new_provider}, {other_provider}],
+            sorted((installed for installed, uninstalled in differences[1]), key=lambda packages: names(packages))
+        )
+
+        # the installed system already provides the dep
+        solutions = self.solve([app], System([new_provider]), upstream_system)
+        self.assertEqual([["app"]], [names(solution) for solution in solutions])
+
+    def test_deep_check_retry(self):
+        # only the package named like the dep is tried first,
+        # the other providers only after that failed
+        app = aur_package("app", depends=["lib", "tool"])
+        lib = repo_package("lib", conflicts=["tool"])
+        lib_alternative = repo_package("lib_alternative", provides=["lib"])
+        tool = repo_package("tool")
+        installed_system = System([])
+        upstream_system = System([app, lib, lib_alternative, tool])
+
+        solutions = self.solve([app], installed_system, upstream_system)
+        self.assertEqual(1, len(solutions))
+        self.assertEqual({"lib_alternative", "tool", "app"}, set(names(solutions[0])))
+        self.assertEqual("app", solutions[0][-1].name)
+
+        valid_systems_tuples = installed_system.validate_solutions(solutions, [app])
+        self.assertEqual(1, len(valid_systems_tuples))
+        self.assertNotIn("lib", valid_systems_tuples[0][0].all_packages_dict)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+from unittest import TestCase, main, skipIf
+
+try:
+    from aurman.classes import Package, System, OverlaySystem, PossibleTypes
+except ImportError:
+    Package = None
+
+
+def repo_package(name, version="1.0-1", **kwargs):
+    return Package(name=name, version=version, type_of=PossibleTypes.REPO_PACKAGE, repo="core", **kwargs)
+
+
+@skipIf(Package is None, "pyalpm not available")
+class TestOverlay_system(TestCase):
+    def test_remove_only_provider(self):
+        app = repo_package("app", depends=["virtual"])
+        provider = repo_package("provider", provides=["virtual=1"], conflicts=["other"])
+        base_system = System([app, provider])
+
+        overlay_system = OverlaySystem(base_system)
+        overlay_system.remove_packages([provider])
+        rebuilt_system = System([app])
+
+        for dict_name in ("provides_dict", "conflicts_dict"):
+            overlay_dict = getattr(overlay_system, dict_name)
+            rebuilt_dict = getattr(rebuilt_system, dict_name)
+            self.assertEqual(set(rebuilt_dict), set(overlay_dict))
+            self.assertEqual(len(rebuilt_dict), len(overlay_dict))
+
+        self.assertNotIn("virtual", overlay_system.provides_dict)
+        self.assertIsNone(overlay_system.provides_dict.get("virtual"))
+        self.assertNotIn("other", overlay_system.conflicts_dict)
+        self.assertEqual([], overlay_system.provided_by("virtual"))
+
+        # appending another provider makes the name contained again
+        other_provider = repo_package("other_provider", provides=["virtual=2"])
+        overlay_system.append_packages([other_provider])
+        self.assertIn("virtual", overlay_system.provides_dict)
+        self.assertEqual(["virtual"], list(overlay_system.provides_dict))
+        self.assertEqual([other_provider], overlay_system.provided_by("virtual"))
+
+        # the base system is not changed
+        self.assertEqual([provider], base_system.provided_by("virtual"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+from unittest import TestCase, main
+
+from aurman.persistent import PersistentList, PersistentMap
+
+
+class CollidingKey:
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.name == other.name
+
+    def __hash__(self):
+        return 42
+
+
+class TestPersistentList(TestCase):
+    def test_persistent_list(self):
+        empty = PersistentList()
+        first = empty.append("a").append("b")
+        second = first.append("c")
+        self.assertEqual([], list(empty))
+        self.assertEqual(["a", "b"], list(first))
+        self.assertEqual(["a", "b", "c"], list(second))
+        self.assertEqual(3, len(second))
+        self.assertIn("a", second)
+        self.assertNotIn("c", first)
+        self.assertEqual(["a", "c"], list(second.remove("b")))
+        self.assertEqual(["a", "b", "c"], list(second))
+        # the last appended occurrence gets removed
+        self.assertEqual(["a", "b", "c"], list(second.append("a").remove("a")))
+        self.assertEqual(["b", "c", "a"], list(second.append("a").remove("a").remove("a").append("a")))
+        with self.assertRaises(ValueError):
+            first.remove("c")
+
+
+class TestPersistentMap(TestCase):
+    def test_persistent_map(self):
+        empty = PersistentMap()
+        first = empty.set("a", 1).set("b", 2)
+        second = first.set("a", 3).delete("b")
+        self.assertEqual({}, dict(empty))
+        self.assertEqual({"a": 1, "b": 2}, dict(first))
+        self.assertEqual({"a": 3}, dict(second))
+        self.assertEqual(2, len(first))
+        self.assertEqual(2, first["b"])
+        self.assertIsNone(second.get("b"))
+        self.assertNotIn("b", second)
+        with self.assertRaises(KeyError):
+            second.delete("b")
+
+    def test_persistent_map_many_keys(self):
+        reference = {}
+        persistent = PersistentMap()
+        for i in range(2000):
+            reference[i * 7919] = i
+            persistent = persistent.set(i * 7919, i)
+        for i in range(0, 2000, 3):
+            del reference[i * 7919]
+            persistent = persistent.delete(i * 7919)
+        self.assertEqual(reference, dict(persistent))
+        self.assertEqual(len(reference), len(persistent))
+
+    def test_persistent_map_hash_collisions(self):
+        keys = [CollidingKey(name) for name in "abcd"]
+        persistent = PersistentMap()
+        for i, key in enumerate(keys):
+            persistent = persistent.set(key, i)
+        self.assertEqual([0, 1, 2, 3], [persistent[key] for key in keys])
+        persistent = persistent.delete(keys[1]).delete(keys[3]).delete(keys[0])
+        self.assertEqual({keys[2]: 2}, dict(persistent))
+
+
+if __name__ == '__main__':
+    main()
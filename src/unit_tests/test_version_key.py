@@ -0,0 +1,91 @@
+from collections import defaultdict
+from itertools import combinations
+from unittest import TestCase, main, skipIf
+
+try:
+    from pyalpm import vercmp
+    from pycman.config import PacmanConfig
+except ImportError:
+    vercmp = None
+
+# versions as found in the repos and the aur
+versions = [
+    "1.0-1", "1.0-2", "1.0-10", "1.0.1-1", "1.0a-1", "1.0b-1", "1.0rc1-1", "1.0rc2-1", "1.0.rc1-1", "1.0_rc1-1",
+    "1.0beta-1", "1.0.beta-1", "1.0alpha2-1", "1.0+1-1", "1.0~rc1-1", "1.00-1", "01.0-1", "1.0.0-1", "1.0.0.0-1",
+    "1.1-1", "1.01-1", "1.10-1", "1.9-1", "1.9.9-1", "2-1", "2.0-1", "10.0-1", "100-1", "1:1.0-1", "1:0.1-1",
+    "2:0.0.1-1", "0:1.0-1", ":1.0-1", "1:1.0rc1-1", "20220101-1", "2022.01.01-1", "2022.10.01-2", "2022.10.1-1",
+    "r123.abcdef0-1", "r1234.0123abc-1", "r99.fffffff-1", "0.r123.abcdef0-1", "1.2.3.r4.g5678abc-1",
+    "1.2.3.r12.g0123def-1", "1.2.3.r12.g0123def-2", "1.2.3.r12.g0123def-1.1", "1.2.3-1.1", "1.2.3-1.2",
+    "1.2.3-1.0.1", "1.2.3-1a", "1.2.3-a", "1.2.3-", "1.2.3-0", "5.15.arch1-1", "5.15.2.arch1-1",
+    "5.15.10.arch1-1", "5.15.9.arch2-1", "6.0.arch1-1", "6.0rc7-1", "6.0.rc7.d0916.gabcdef0-1",
+    "1:2.38.1-2", "1:2.38.1+r12+gabcdef-1", "1:2.38.1+r3+g012345-1", "2.38.1+14+g9a1b2c3-1",
+    "3.2.1_p1-1", "3.2.1_p2-1", "3.2.1p1-1", "3.2.1.p1-1", "0.9.9_beta-1", "0.9.9_beta2-1", "0.9.9-1",
+    "2.4.54-1", "2.4.54-2", "2.4.9-1", "7.85.0-1", "7.86.0-1", "1:7.86.0-1", "15.2.0-1", "15.2.0_1-1",
+    "0.10.0-1", "0.9.10-1", "0.9-1", "0.0.1-1", "0-1", "a-1", "b-1", "a1-1", "a.1-1", "1a-1", "1.a-1",
+    "1..0-1", "1...0-1", "1.-0-1", "1_0-1", "1-0-1", "1.0-1-1", "1.0.0a-1", "1.0.0.a-1", "1.0.0aa-1",
+    "1.0.0ab-1", "1.0.0b-1", "1.0.0B-1", "1.0.0Z-1", "1.0.0z-1", "8.2.5088-1", "9.0.0814-1", "9.0.814-1",
+    "4.9.3-1", "4.10.0-1", "102.0.1-1", "102.0-1", "102-1", "3.11.0rc2-1", "3.11.0-1", "3.10.8-1",
+    "2.40.0-1", "2.40.0-1.2", "1.18.2+11+g01-1", "1.18.2+2+g02-1", "1.18.2-1", "4.4.0.ffmpeg-1", "5.1.2-3",
+    "1.2.3+git20221010.abcdef-1", "1.2.3+git20221009.abcdef-1", "1.2.3.git20221010-1", "0.15.0.dev12-1",
+    "0.15.0.post1-1", "0.15.0-1", "2.0.0-alpha.1-1", "2.0.0-beta.1-1", "20221010.r1.abc-1", "v1.0-1",
+    "V1.0-1", "1:v1.0-1", "12:1.0-1", "3:1-1", "1.0~beta2-1", "1.0~beta10-1", "1.0~~rc-1", "1.0é1-1",
+]
+
+
+def versions_of_databases():
+    """
+    :return:    The names of the packages in the local and the sync databases as keys,
+                the versions of the packages with that name as values
+    """
+    handle = PacmanConfig(conf="/etc/pacman.conf").initialize_alpm()
+    versions_by_name = defaultdict(set)
+    for db in [handle.get_localdb()] + handle.get_syncdbs():
+        for package in db.pkgcache:
+            versions_by_name[package.name].add(package.version)
+    return versions_by_name
+
+
+@skipIf(vercmp is None, "pyalpm not available")
+class TestVersion_key(TestCase):
+    def assert_same_order(self, version_pairs):
+        from aurman.utilities import version_key
+
+        for version1, version2 in version_pairs:
+            key1, key2 = version_key(version1), version_key(version2)
+            self.assertTrue(key1 and key2, "{} {}".format(version1, version2))
+            key_result = (key1 > key2) - (key1 < key2)
+            vercmp_result = int(vercmp(version1, version2))
+            vercmp_result = (vercmp_result > 0) - (vercmp_result < 0)
+            self.assertEqual(vercmp_result, key_result, "{} {}".format(version1, version2))
+
+    def test_version_key_order(self):
+        self.assert_same_order(combinations(versions, 2))
+
+    def test_version_key_order_databases(self):
+        # the real versions of the installed and the repo packages, if the pacman databases are available
+        try:
+            versions_by_name = versions_of_databases()
+        except Exception as e:
+            self.skipTest("pacman databases not available: {}".format(e))
+
+        self.assert_same_order(
+            version_pair for name_versions in versions_by_name.values()
+            for version_pair in combinations(sorted(name_versions), 2)
+        )
+
+    def test_version_key_without_key(self):
+        from aurman.utilities import version_key, version_comparison_by_keys
+
+        # no pkgrel
+        self.assertEqual((), version_key("1.0"))
+        self.assertEqual((), version_key("1:1.0"))
+        # trailing separators
+        self.assertEqual((), version_key("1.0.-1"))
+        self.assertEqual((), version_key("1.0-1."))
+
+        self.assertTrue(version_comparison_by_keys("1.0", "=", "1.0-2", version_key("1.0"), version_key("1.0-2")))
+        self.assertTrue(version_comparison_by_keys("1.1-1", ">", "1.0-2", version_key("1.1-1"), version_key("1.0-2")))
+
+
+if __name__ == '__main__':
+    main()